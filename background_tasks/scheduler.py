@@ -1,62 +1,374 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 import asyncio
-from services.postgres import save_jobs, get_latest_jobs, has_alert_been_sent, log_job_alert, alert_count_last_hour, get_all_alerts_for_users_and_jobs
-from services.apify_scrapper import fetch_upwork_jobs_from_apify
-from services.notification import match_jobs_to_filter, send_telegram_alert
-from services.supabase import get_users_with_filters_and_telegram
+import time
+import random
+from services.postgres_async import (
+    save_jobs, get_latest_jobs, record_job_alerts, release_job_alerts,
+    get_jobs_after_seq, get_pipeline_cursor, set_pipeline_cursor, get_recent_job_ids, get_shard_resume_cursor,
+    sync_recent_jobs,
+)
+from services.recent_jobs import recent_jobs, RECENT_JOBS_MODE
+from services.postgres import maintain_partitions, shard_cursor_name
+from services.apify_scrapper import fetch_upwork_jobs_from_apify, fetch_new_upwork_jobs_from_apify, seen_job_ids
+from services.notification import (
+    send_telegram_alert, send_telegram_digest, DigestBuffer, DIGEST_WINDOW_SECONDS, rendered_jobs,
+)
+from services.matcher import FilterIndex
+from services.enrichment import enrich_jobs
+from services.supabase import get_users_with_filters_and_telegram, get_subscribers_version
+from services.outbox import enqueue_matches, workers as outbox_workers
+from services.coordination import leader, membership, coordination_enabled
+from services.metrics import (
+    CRAWL_DURATION, CRAWL_ITEMS, MATCH_DURATION, MATCHES, ALERTS, SCHEDULER_JOB_DURATION, SCHEDULER_EVENTS,
+)
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 from uuid import UUID
 
-def notify_users_of_new_jobs():
-    jobs = get_latest_jobs()
-    users = get_users_with_filters_and_telegram()
-    user_ids = [user['user_id'] for user in users]
-    job_ids = [job['id'] for job in jobs]
-    sent_alerts = get_all_alerts_for_users_and_jobs(user_ids, job_ids)  # returns set of (user_id, job_id)
-    # logging.info(f"[Scheduler] Sent {sent_alerts} alerts")
-    sent_this_run = set()  # Track (user_id, job_id) sent in this run
-    for job in jobs:
-        for user in users:
-            for filter in user['filters']:
-                key = (UUID(str(user['user_id'])), job['id'])
-                # logging.info(f"[Scheduler] key: {key}")
-                if match_jobs_to_filter([job], filter):
-                    if key not in sent_alerts and key not in sent_this_run:
-                        send_telegram_alert(user['telegram_id'], [job])
-                        log_job_alert(user['user_id'], job['id'])
-                        sent_this_run.add(key)
+# "pipeline": crawl → match → notify in one job driven by the ingest cursor
+# "interval": legacy independent crawl and alert jobs over the last 10 minutes
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "pipeline")
+# "stream": paged, incremental dataset reads that skip already-ingested IDs
+# "sync": legacy run-sync-get-dataset-items call that downloads the whole dataset
+APIFY_INGEST_MODE = os.getenv("APIFY_INGEST_MODE", "stream")
+# "outbox": matches are queued in alert_outbox and sent by the delivery workers
+# "inline": legacy claim-then-send inside the alert cycle
+ALERT_DELIVERY = os.getenv("ALERT_DELIVERY", "outbox")
+# "batch": non-text predicates evaluated as NumPy masks over the whole cycle, then keywords
+# "per_job": each job is run through the filter index on its own
+MATCH_EVALUATION = os.getenv("MATCH_EVALUATION", "batch")
+ALERT_WINDOW_MINUTES = 10
+JOB_INTERVAL_SECONDS = 50
+# First runs are spread over this many seconds, so instances that start together
+# (rolling deploys, scale-out) do not all crawl and match at the same moment
+SCHEDULER_STARTUP_JITTER_SECONDS = float(os.getenv("SCHEDULER_STARTUP_JITTER_SECONDS", "15"))
+ALERT_CURSOR = "alerts"
+
+_filter_index = (None, None)  # ((subscriber registry version, live instances), FilterIndex)
+
+def get_filter_index(users):
+    # Recompile only when the subscriber registry or this instance's share of users changed
+    global _filter_index
+    if coordination_enabled():
+        key = (get_subscribers_version(), membership.members)
+    else:
+        key = (get_subscribers_version(), None)
+    if _filter_index[0] != key:
+        owned = membership.owned_users(users) if coordination_enabled() else users
+        _filter_index = (key, FilterIndex(owned))
+    return _filter_index[1]
+
+digest_buffer = DigestBuffer(DIGEST_WINDOW_SECONDS)
+
+async def notify_users_of_new_jobs(jobs=None):
+    """Match jobs and deliver or queue the alerts; returns deliver_alerts' retry position with inline delivery."""
+    if jobs is None:
+        if recent_jobs.fresh():
+            jobs = recent_jobs.latest(ALERT_WINDOW_MINUTES)
+        else:
+            jobs = await get_latest_jobs(minutes=ALERT_WINDOW_MINUTES)
+    if not jobs:
+        if ALERT_DELIVERY == "inline":
+            return await deliver_alerts({})
+        return None
+    # Supabase's client is synchronous; keep it off the event loop
+    users = await asyncio.to_thread(get_users_with_filters_and_telegram)
+    matches = {}  # (user_id, job_id) -> (user, job)
+    with MATCH_DURATION.time():
+        # Compile all filters once, then scan each job a single time against the index
+        index = get_filter_index(users)
+        if MATCH_EVALUATION == "batch":
+            matched_users = index.match_users_batch(jobs)
+        else:
+            matched_users = ((job, index.match_users(job)) for job in jobs)
+        for job, job_users in matched_users:
+            for user in job_users:
+                matches.setdefault((UUID(str(user['user_id'])), job['id']), (user, job))
+    MATCHES.inc(len(matches))
+
+    # Format each matched job once for all of its recipients; jobs that can no longer
+    # be delivered (past the alert window and any digest hold) are dropped
+    rendered_jobs.evict_before(
+        datetime.utcnow() - timedelta(minutes=ALERT_WINDOW_MINUTES, seconds=DIGEST_WINDOW_SECONDS)
+    )
+    if ALERT_DELIVERY == "outbox":
+        await enqueue_matches(matches)
+        return None
+    for _, job in matches.values():
+        rendered_jobs.get(job)
+    return await deliver_alerts(matches)
+
+
+async def deliver_alerts(matches):
+    """
+    Send instant matches now; digest users' matches are buffered and sent once their window is due.
+    Returns the lowest ingest_seq among jobs whose alerts were released for retry (None if there
+    are none), so the pipeline can keep its cursor below them and match them again next cycle.
+    """
+    instant = {}
+    for key, (user, job) in matches.items():
+        if user.get('delivery_mode') == 'digest':
+            digest_buffer.add(key[0], user, job)
+        else:
+            instant[key] = (user, job)
+    due = digest_buffer.pop_due()
+    pairs = list(instant) + [(user_id, job_id) for user_id, _, jobs in due for job_id in jobs]
+    if not pairs:
+        return None
+    seqs = {job_id: job.get('ingest_seq') for (_, job_id), (_, job) in instant.items()}
+    seqs.update((job_id, job.get('ingest_seq')) for _, _, jobs in due for job_id, job in jobs.items())
+
+    # The database decides what is new: only pairs claimed by this insert are sent
+    claimed = await record_job_alerts(pairs)
+    ALERTS.labels("claimed").inc(len(claimed))
+    sends = []  # (user_id, coroutine)
+    for key, (user, job) in instant.items():
+        if key in claimed:
+            sends.append((key[0], send_telegram_alert(user['telegram_id'], [job])))
+    for user_id, user, jobs in due:
+        fresh = [job for job_id, job in jobs.items() if (user_id, job_id) in claimed]
+        if fresh:
+            sends.append((user_id, send_telegram_digest(user['telegram_id'], fresh)))
+
+    # Deliver concurrently; the delivery engine enforces Telegram's rate limits
+    results = await asyncio.gather(*(send for _, send in sends))
+    retry = []
+    messages = failed = 0
+    for (user_id, _), user_results in zip(sends, results):
+        for result in user_results:
+            messages += 1
+            if result.ok:
+                continue
+            failed += 1
+            # Permanent failures (blocked bot, unknown chat) stay claimed so they are not retried every cycle
+            if result.retryable:
+                job_ids = result.ref if isinstance(result.ref, tuple) else (result.ref,)
+                retry.extend((user_id, job_id) for job_id in job_ids)
+    await release_job_alerts(retry)
+    ALERTS.labels("delivered").inc(messages - failed)
+    ALERTS.labels("failed").inc(failed)
+    ALERTS.labels("released").inc(len(retry))
+    if sends:
+        logging.info(f"[Scheduler] Delivered {messages - failed}/{messages} messages for {len(claimed)} alerts")
+    retry_seqs = [seqs[job_id] for _, job_id in retry if seqs.get(job_id) is not None]
+    return min(retry_seqs) if retry_seqs else None
+
+
+def cursor_after(high, retry_from):
+    # Released alerts are only retried if their job is read again: hold the cursor just below
+    # the oldest one (job_alerts claims drop whatever was delivered in between)
+    return high if retry_from is None else min(high, retry_from - 1)
+
+
+async def run_leader_crawler():
+    # Only the advisory-lock holder crawls; the others take over if it goes away
+    if coordination_enabled() and not await leader.acquire():
+        return []
+    return await run_crawler()
+
+
+async def run_crawler():
+    with CRAWL_DURATION.labels(APIFY_INGEST_MODE).time():
+        new_ids = await _crawl()
+    CRAWL_ITEMS.labels("new").inc(len(new_ids))
+    return new_ids
+
+
+async def _crawl():
+    if APIFY_INGEST_MODE == "stream":
+        # Only items not ingested before come back; an empty result is the normal steady state
+        jobs = enrich_jobs(await fetch_new_upwork_jobs_from_apify(get_recent_job_ids))
+        new_ids = await save_jobs(jobs) if jobs else []
+        seen_job_ids.remember(new_ids)
+        logging.info(f"[Scheduler] Fetched {len(jobs)} unseen jobs, {len(new_ids)} new")
+        return new_ids
+
+    jobs = enrich_jobs(await fetch_upwork_jobs_from_apify())
+    if jobs:
+        new_ids = await save_jobs(jobs)
+        logging.info(f"[Scheduler] Fetched {len(jobs)} jobs, {len(new_ids)} new")
+        return new_ids
+    logging.error("[Scheduler] No jobs fetched")
+    return []
+
+
+async def refresh_recent_jobs():
+    # One indexed read of whatever was inserted past the watermark; this also confirms this process's own inserts
+    if RECENT_JOBS_MODE != "memory":
+        return
+    try:
+        await sync_recent_jobs()
+    except Exception as e:
+        logging.error(f"[Scheduler] Recent jobs sync failed: {e}")
+
+
+async def read_jobs_after_seq(after_seq):
+    if recent_jobs.fresh():
+        return recent_jobs.after_seq(after_seq, ALERT_WINDOW_MINUTES)
+    return await get_jobs_after_seq(after_seq, minutes=ALERT_WINDOW_MINUTES)
+
+
+_cursor_current = False  # cursor known to match the newest ingested job in this process
+
+async def process_ingested_jobs():
+    global _cursor_current
+    cursor = await get_pipeline_cursor(ALERT_CURSOR, minutes=ALERT_WINDOW_MINUTES)
+    jobs, high = await read_jobs_after_seq(cursor)
+    retry_from = None
+    if high is not None:
+        retry_from = await notify_users_of_new_jobs(jobs)
+        position = cursor_after(high, retry_from)
+        await set_pipeline_cursor(ALERT_CURSOR, position)
+        logging.info(f"[Scheduler] Processed {len(jobs)} new jobs, cursor {cursor} -> {position}")
+    # With alerts to retry the next cycle must run even if nothing new is crawled
+    _cursor_current = retry_from is None
+
+
+async def run_pipeline():
+    if coordination_enabled():
+        await run_shard_pipeline()
+        return
+    new_ids = await run_crawler()
+    await refresh_recent_jobs()
+    # Nothing was inserted and earlier work is done: skip matching (and the Supabase load) entirely
+    if not new_ids and _cursor_current:
+        if digest_buffer:
+            await hold_cursor_for_retries(await deliver_alerts({}))
+        return
+    await process_ingested_jobs()
+
+
+async def hold_cursor_for_retries(retry_from):
+    global _cursor_current
+    if retry_from is None:
+        return
+    cursor = await get_pipeline_cursor(ALERT_CURSOR, minutes=ALERT_WINDOW_MINUTES)
+    await set_pipeline_cursor(ALERT_CURSOR, cursor_after(cursor, retry_from))
+    _cursor_current = False
+
+
+_shard_cursor = None  # alert cursor for this instance's share of users, persisted per instance
+
+async def run_shard_pipeline():
+    """
+    Coordinated pipeline: the leader crawls, then every instance matches the newly ingested
+    jobs against the users it owns. After a restart or when instances join or leave, users
+    may change owners, so the cursor resumes from the least advanced persisted shard cursor;
+    job_alerts claims drop anything already sent.
+    """
+    global _shard_cursor
+    if await membership.heartbeat():
+        _shard_cursor = None
+    if await leader.acquire():
+        await run_crawler()
+    await refresh_recent_jobs()
+    if _shard_cursor is None:
+        _shard_cursor = await get_shard_resume_cursor(ALERT_CURSOR, minutes=ALERT_WINDOW_MINUTES)
+    jobs, high = await read_jobs_after_seq(_shard_cursor)
+    if high is None:
+        if not digest_buffer:
+            return
+        high, retry_from = _shard_cursor, await deliver_alerts({})
+        if retry_from is None:
+            return
+    else:
+        retry_from = await notify_users_of_new_jobs(jobs)
+    position = cursor_after(high, retry_from)
+    await set_pipeline_cursor(shard_cursor_name(membership.instance_id), position)
+    logging.info(f"[Scheduler] Processed {len(jobs)} new jobs for {membership.instance_id}, cursor {_shard_cursor} -> {position}")
+    _shard_cursor = position
+
+
+async def run_alerts():
+    if coordination_enabled():
+        await membership.heartbeat()
+    await refresh_recent_jobs()
+    await notify_users_of_new_jobs()
+
+
+async def run_partition_maintenance():
+    if coordination_enabled():
+        if not await leader.acquire():
+            return
+        await membership.purge_expired()
+    try:
+        await asyncio.to_thread(maintain_partitions)
+    except Exception as e:
+        logging.error(f"[Scheduler] Partition maintenance failed: {e}")
+
+
+def timed_job(name, interval_seconds, func):
+    """Wrap a scheduler job to record its run time and count runs longer than its interval."""
+    async def run():
+        started = time.perf_counter()
+        try:
+            await func()
+        finally:
+            elapsed = time.perf_counter() - started
+            SCHEDULER_JOB_DURATION.labels(name).observe(elapsed)
+            if elapsed > interval_seconds:
+                SCHEDULER_EVENTS.labels(name, "overrun").inc()
+                logging.warning(f"[Scheduler] Job '{name}' took {elapsed:.1f}s, longer than its {interval_seconds}s interval")
+    return run
+
+
+def on_job_event(event):
+    # Skipped runs (still running, or fired too late) and failures, by job id
+    kind = {EVENT_JOB_MAX_INSTANCES: "skipped", EVENT_JOB_MISSED: "missed", EVENT_JOB_ERROR: "error"}[event.code]
+    SCHEDULER_EVENTS.labels(event.job_id, kind).inc()
+
+
+def first_run_time(delay_seconds=0):
+    return datetime.now() + timedelta(seconds=delay_seconds + random.uniform(0, SCHEDULER_STARTUP_JITTER_SECONDS))
 
 
 def start_scheduler():
+    if ALERT_DELIVERY == "outbox":
+        outbox_workers.start()
     scheduler = AsyncIOScheduler()
-    
-    # Wrap the async function so it can be scheduled
-    async def run_crawler():
-        jobs = await fetch_upwork_jobs_from_apify()
-        if jobs:
-            save_jobs(jobs)
-            logging.info(f"[Scheduler] Fetched and saved {len(jobs)} jobs")
-        else:
-            logging.error("[Scheduler] No jobs fetched")
+    scheduler.add_listener(on_job_event, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED | EVENT_JOB_ERROR)
 
-    async def send_alerts_for_new_jobs():
-        notify_users_of_new_jobs()
+    # Keep upcoming partitions ready and drop the ones past retention
+    scheduler.add_job(
+        timed_job("partition_maintenance", 3600, run_partition_maintenance),
+        trigger=IntervalTrigger(hours=1),
+        id="partition_maintenance",
+        # Soon after boot too, since startup no longer runs the full schema setup every time
+        next_run_time=first_run_time(60),
+        max_instances=1,
+        coalesce=True,
+    )
 
+    if SCHEDULER_MODE == "pipeline":
+        # One job: whatever the crawl inserted goes straight to matching and delivery
+        scheduler.add_job(
+            timed_job("pipeline", JOB_INTERVAL_SECONDS, run_pipeline),
+            trigger=IntervalTrigger(seconds=JOB_INTERVAL_SECONDS),
+            id="pipeline",
+            next_run_time=first_run_time(),
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.start()
+        return
 
     # Add job to run immediately and then every minute
     scheduler.add_job(
-        run_crawler, 
-        trigger=IntervalTrigger(seconds=50),
-        next_run_time=datetime.now()
+        timed_job("crawler", JOB_INTERVAL_SECONDS, run_leader_crawler),
+        trigger=IntervalTrigger(seconds=JOB_INTERVAL_SECONDS),
+        id="crawler",
+        next_run_time=first_run_time()
     )
 
     # Schedule alert sending
     scheduler.add_job(
-        send_alerts_for_new_jobs,
-        trigger=IntervalTrigger(seconds=50),
-        next_run_time=datetime.now()
+        timed_job("alerts", JOB_INTERVAL_SECONDS, run_alerts),
+        trigger=IntervalTrigger(seconds=JOB_INTERVAL_SECONDS),
+        id="alerts",
+        next_run_time=first_run_time()
     )
 
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
@@ -0,0 +1,40 @@
+"""
+Compare two benchmark result files stage by stage.
+
+    python -m benchmarks.compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+"""
+import sys
+import json
+
+
+def change(base, head, higher_is_better):
+    if not base or head is None:
+        return ""
+    delta = (head - base) / base * 100
+    better = delta > 0 if higher_is_better else delta < 0
+    return f"{delta:+.1f}%{' ✓' if better and abs(delta) >= 5 else ' ✗' if not better and abs(delta) >= 5 else ''}"
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1]) as f:
+        base = json.load(f)
+    with open(sys.argv[2]) as f:
+        head = json.load(f)
+
+    print(f"base {base['meta'].get('commit')}  head {head['meta'].get('commit')}")
+    print(f"{'stage':<26}{'per s':>16}{'p50':>16}{'p99':>16}")
+    for name in list(base["stages"]) + [s for s in head["stages"] if s not in base["stages"]]:
+        b, h = base["stages"].get(name), head["stages"].get(name)
+        if not b or not h:
+            print(f"{name:<26}{'only in ' + ('head' if h else 'base'):>16}")
+            continue
+        print(f"{name:<26}"
+              f"{change(b['throughput_per_s'], h['throughput_per_s'], True):>16}"
+              f"{change(b['p50_ms'], h['p50_ms'], False):>16}"
+              f"{change(b['p99_ms'], h['p99_ms'], False):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmark matching, ingestion, alert fan-out and the filtered-jobs API against a local
+Postgres and stub Telegram/Supabase servers.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.run --users 10000 --jobs 10000
+
+BENCH_DATABASE_URL must point at a throwaway database: the jobs and alert tables are
+truncated before the run. Results are written as JSON (see benchmarks/compare.py).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+from benchmarks import synthetic
+from benchmarks.stubs import StubServer, telegram_stub, supabase_stub
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, units, elapsed):
+    """latencies in seconds per operation; units is the number of items the operations covered."""
+    ordered = sorted(latencies)
+    return {
+        "operations": len(ordered),
+        "units": units,
+        "elapsed_s": round(elapsed, 6),
+        "throughput_per_s": round(units / elapsed, 3) if elapsed else None,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4) if ordered else None,
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4) if ordered else None,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else None,
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else None,
+    }
+
+
+def timed(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+async def timed_async(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        await fn(item)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def bench_matching(results, jobs, users, legacy_sample, cycle_size):
+    from services.notification import match_jobs_to_filter
+    from services.matcher import FilterIndex
+
+    def legacy(job):
+        for user in users:
+            for f in user["filters"]:
+                if match_jobs_to_filter([job], f):
+                    break
+
+    latencies, elapsed = timed(legacy, jobs[:legacy_sample])
+    results["match_legacy"] = summarize(latencies, len(latencies), elapsed)
+
+    start = time.perf_counter()
+    index = FilterIndex(users)
+    build = time.perf_counter() - start
+    results["filter_index_build"] = summarize([build], sum(len(u["filters"]) for u in users), build)
+
+    latencies, elapsed = timed(index.match_users, jobs)
+    results["match_index"] = summarize(latencies, len(jobs), elapsed)
+
+    # One cycle's worth of jobs per call, as the alert loop passes them; the first call also builds the columns
+    cycles = [jobs[i:i + cycle_size] for i in range(0, len(jobs), cycle_size)]
+    latencies, elapsed = timed(lambda cycle: list(index.match_users_batch(cycle)), cycles)
+    results["match_batch"] = summarize(latencies, len(jobs), elapsed)
+
+
+async def bench_ingest(results, jobs, batch_size):
+    from services import postgres_async
+
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    latencies, elapsed = await timed_async(postgres_async.save_jobs, batches)
+    results["ingest"] = summarize(latencies, len(jobs), elapsed)
+    # Re-crawl of the same items: every row conflicts
+    latencies, elapsed = await timed_async(postgres_async.save_jobs, batches)
+    results["ingest_duplicates"] = summarize(latencies, len(jobs), elapsed)
+
+
+def telegram_calls(telegram):
+    import httpx
+    return httpx.get(f"{telegram.url}/stats").json()["calls"]
+
+
+async def outbox_drained():
+    from sqlalchemy import text
+    from services.postgres_async import get_async_engine
+    while True:
+        async with get_async_engine().connect() as conn:
+            if not (await conn.execute(text("SELECT 1 FROM alert_outbox WHERE status = 'pending' LIMIT 1"))).first():
+                return
+        await asyncio.sleep(0.05)
+
+
+async def bench_fanout(results, fanout_jobs, cycle_size, telegram):
+    from services import postgres_async
+    from services.supabase import get_users_with_filters_and_telegram
+    from services.outbox import workers as outbox_workers
+    from background_tasks import scheduler
+
+    start = time.perf_counter()
+    await asyncio.to_thread(get_users_with_filters_and_telegram)
+    load = time.perf_counter() - start
+    results["subscriber_load"] = summarize([load], 1, load)
+
+    jobs = (await postgres_async.get_latest_jobs(minutes=scheduler.ALERT_WINDOW_MINUTES))[:fanout_jobs]
+    cycles = [jobs[i:i + cycle_size] for i in range(0, len(jobs), cycle_size)]
+    calls_before = telegram_calls(telegram)
+    if scheduler.ALERT_DELIVERY == "outbox":
+        outbox_workers.start()
+    start = time.perf_counter()
+    latencies, elapsed = await timed_async(scheduler.notify_users_of_new_jobs, cycles)
+    if scheduler.ALERT_DELIVERY == "outbox":
+        # Cycles only queue alerts; messages are counted once the workers have drained the outbox
+        await outbox_drained()
+        await outbox_workers.stop()
+    delivered = time.perf_counter() - start
+    messages = telegram_calls(telegram) - calls_before
+    results["fanout_cycle"] = summarize(latencies, len(jobs), elapsed)  # units: jobs
+    results["fanout_messages"] = summarize(latencies, messages, delivered)
+
+
+async def bench_api(results, users, requests, seed):
+    import httpx
+    from fastapi import FastAPI
+    from routers import jobs as jobs_router
+    from services.query_cache import filtered_jobs_cache
+    from services.postgres_async import load_recent_jobs
+    from services.recent_jobs import RECENT_JOBS_MODE
+
+    app = FastAPI()
+    app.include_router(jobs_router.router, prefix="/api")
+    rng = random.Random(seed)
+    queries = []
+    filters = [f for user in users for f in user["filters"] if f["categories"]]
+    for _ in range(requests):
+        f = rng.choice(filters)
+        queries.append({"categories": f["categories"], "keywords": f["keywords"][:2], "limit": 50})
+    headers = {"x-api-key": os.environ["API_SECRET_KEY"]}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def cold(params):
+            filtered_jobs_cache.entries.clear()
+            (await client.get("/api/fetch_filtered_jobs", params=params, headers=headers)).raise_for_status()
+
+        async def warm(params):
+            (await client.get("/api/fetch_filtered_jobs", params=params, headers=headers)).raise_for_status()
+
+        latencies, elapsed = await timed_async(cold, queries)
+        results["api_filtered_jobs_cold"] = summarize(latencies, len(queries), elapsed)
+        if RECENT_JOBS_MODE == "memory":
+            # Same queries answered from the recent-jobs window, as a warmed-up server does
+            await load_recent_jobs()
+            latencies, elapsed = await timed_async(cold, queries)
+            results["api_filtered_jobs_memory"] = summarize(latencies, len(queries), elapsed)
+        for params in queries:
+            await warm(params)
+        latencies, elapsed = await timed_async(warm, queries)
+        results["api_filtered_jobs_warm"] = summarize(latencies, len(queries), elapsed)
+
+
+async def run_async(args, results, jobs, users, telegram):
+    from services.postgres_async import close_async_engine
+    from services.telegram_delivery import close_delivery_engine
+    try:
+        if "ingest" in args.stages:
+            await bench_ingest(results, jobs, args.batch_size)
+        if "fanout" in args.stages:
+            await bench_fanout(results, args.fanout_jobs, args.cycle_size, telegram)
+        if "api" in args.stages:
+            await bench_api(results, users, args.api_requests, args.seed)
+    finally:
+        await close_delivery_engine()
+        await close_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stages", default="match,ingest,fanout,api",
+                        help="comma-separated subset of match,ingest,fanout,api")
+    parser.add_argument("--legacy-sample", type=int, default=200,
+                        help="jobs run through the per-filter legacy matcher (it is O(jobs x filters))")
+    parser.add_argument("--batch-size", type=int, default=500, help="jobs per save_jobs call")
+    parser.add_argument("--fanout-jobs", type=int, default=500,
+                        help="jobs pushed through alert delivery (messages grow with jobs x users)")
+    parser.add_argument("--cycle-size", type=int, default=50, help="jobs per alert cycle")
+    parser.add_argument("--api-requests", type=int, default=200)
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0)
+    parser.add_argument("--telegram-concurrency", type=int, default=20, help="TELEGRAM_MAX_CONCURRENCY for the run")
+    parser.add_argument("--out", default=None, help="results path (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+    args.stages = set(args.stages.split(","))
+
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    if not database_url and args.stages - {"match"}:
+        sys.exit("BENCH_DATABASE_URL is required for the ingest, fanout and api stages")
+
+    logging.basicConfig(level=logging.WARNING)
+    tables = synthetic.subscribers(args.users, seed=args.seed + 1)
+    users = synthetic.users_with_filters(tables)
+    with StubServer(telegram_stub, args.telegram_latency_ms) as telegram, \
+            StubServer(supabase_stub, tables) as supabase:
+        # Services read their configuration at import time, so it is set before any import
+        os.environ.update({
+            "DATABASE_URL": database_url or "postgresql://localhost/unused",
+            "SUPABASE_URL": supabase.url,
+            "SUPABASE_SERVICE_KEY": "bench",
+            "SUPABASE_FILTER_SKILLS_TABLE": "filter_skills",
+            "TELEGRAM_BOT_TOKEN": "bench",
+            "TELEGRAM_API_URL": telegram.url,
+            # Measure our own overhead, not Telegram's rate limits
+            "TELEGRAM_GLOBAL_RATE": "1000000",
+            "TELEGRAM_PER_CHAT_RATE": "1000000",
+            "TELEGRAM_PER_CHAT_BURST": "1000000",
+            "TELEGRAM_MAX_CONCURRENCY": str(args.telegram_concurrency),
+            "API_SECRET_KEY": "bench",
+        })
+        from services.apify_scrapper import normalize_item
+
+        items = synthetic.apify_items(args.jobs, seed=args.seed)
+        results = {}
+        latencies, elapsed = timed(normalize_item, items)
+        results["normalize"] = summarize(latencies, len(items), elapsed)
+        jobs = [normalize_item(item) for item in items]
+
+        if "match" in args.stages:
+            from services.enrichment import enrich_jobs
+            match_jobs = [dict(job, id=job["url"].split("~")[-1], budget=float(job["budget"] or 0)) for job in enrich_jobs(jobs)]
+            bench_matching(results, match_jobs, users, args.legacy_sample, args.cycle_size)
+
+        if args.stages - {"match"}:
+            from sqlalchemy import text
+            from services import postgres
+            postgres.setup_database()
+            with postgres.get_engine().begin() as conn:
+                conn.execute(text("TRUNCATE jobs, job_alerts, job_alert_counts, pipeline_cursors, alert_outbox"))
+            postgres.get_engine().dispose()
+            asyncio.run(run_async(args, results, jobs, users, telegram))
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: sorted(v) if isinstance(v, set) else v for k, v in vars(args).items()},
+        },
+        "stages": results,
+    }
+    out = args.out or os.path.join("benchmarks", "results", f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'stage':<26}{'units':>10}{'per s':>14}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, stage in results.items():
+        print(f"{name:<26}{stage['units']:>10}{stage['throughput_per_s'] or 0:>14.1f}"
+              f"{stage['p50_ms'] or 0:>12.3f}{stage['p99_ms'] or 0:>12.3f}")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import time
+import socket
+import asyncio
+import multiprocessing
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def telegram_stub(latency_ms: float = 0.0) -> FastAPI:
+    """Bot API stand-in: accepts every method and counts the calls."""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/bot{token}/{method}")
+    async def call(token: str, method: str):
+        app.state.calls += 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return {"ok": True, "result": {"message_id": app.state.calls}}
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": app.state.calls}
+
+    return app
+
+
+def _parse_filter(value: str):
+    op, _, arg = value.partition(".")
+    if op == "in":
+        return op, {v.strip('"') for v in arg.strip("()").split(",") if v}
+    return op, arg
+
+
+def _matches(row, column, op, arg):
+    value = row.get(column)
+    if op == "in":
+        return str(value) in arg
+    if op == "eq":
+        return str(value) == arg
+    if op == "neq":
+        return value is not None if arg == "None" else str(value) != arg
+    if op == "gt":
+        return value is not None and str(value) > arg
+    return True
+
+
+def supabase_stub(tables: dict) -> FastAPI:
+    """
+    PostgREST stand-in serving in-memory tables: supports the in/eq/neq/gt filters and
+    offset/limit paging used by services/supabase.py. `or` (plan/trial eligibility) is
+    ignored, so every generated profile counts as eligible.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        app.state.calls += 1
+        rows = tables.get(table, [])
+        offset = limit = None
+        for key, value in request.query_params.multi_items():
+            if key in ("select", "order", "or"):
+                continue
+            if key == "offset":
+                offset = int(value)
+            elif key == "limit":
+                limit = int(value)
+            else:
+                op, arg = _parse_filter(value)
+                rows = [row for row in rows if _matches(row, key, op, arg)]
+        start = offset or 0
+        return rows[start:start + limit] if limit is not None else rows[start:]
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str):
+        return []
+
+    return app
+
+
+def _serve(factory, args, port):
+    uvicorn.run(factory(*args), host="127.0.0.1", port=port, log_level="warning")
+
+
+class StubServer:
+    """
+    Runs `factory(*args)` with uvicorn on a free local port in a separate process, so
+    the stub does not compete with the code under test for the GIL.
+    """
+
+    def __init__(self, factory, *args):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.process = multiprocessing.get_context("fork").Process(
+            target=_serve, args=(factory, args, self.port), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or not self.process.is_alive():
+                    raise RuntimeError("stub server did not start")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join(timeout=5)
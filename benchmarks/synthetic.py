@@ -0,0 +1,135 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+CATEGORIES = [
+    "Web, Mobile & Software Dev", "Data Science & Analytics", "Design & Creative",
+    "Sales & Marketing", "Writing", "IT & Networking", "Admin Support", "Engineering & Architecture",
+]
+COUNTRIES = ["United States", "United Kingdom", "Germany", "India", "Canada", "Australia", "France", "Brazil"]
+SKILLS = [
+    "Python", "Django", "FastAPI", "React", "Node.js", "TypeScript", "PostgreSQL", "AWS", "Docker",
+    "Machine Learning", "Data Analysis", "SEO", "Figma", "WordPress", "Shopify", "Flutter", "Kotlin",
+    "Swift", "Go", "Rust", "Scraping", "Excel", "Copywriting", "Video Editing", "Kubernetes",
+]
+WORDS = [
+    "build", "app", "website", "api", "dashboard", "automation", "integration", "bot", "landing",
+    "page", "backend", "frontend", "mobile", "store", "migration", "report", "model", "pipeline",
+    "design", "logo", "content", "campaign", "fix", "bug", "feature", "performance", "database",
+    "scraper", "chatbot", "analytics", "plugin", "theme", "payment", "stripe", "telegram", "openai",
+]
+# Descriptions are mostly filler so filter keywords are about as selective as in real traffic
+FILLER = [
+    "we", "are", "looking", "for", "an", "experienced", "developer", "to", "help", "with", "our",
+    "project", "the", "and", "a", "is", "in", "on", "that", "will", "need", "must", "have", "good",
+    "communication", "long", "term", "work", "team", "start", "asap", "budget", "flexible", "please",
+    "include", "examples", "of", "previous", "similar", "tasks", "timeline", "weeks", "daily", "updates",
+]
+
+
+def _sentence(rng, n, mentions=()):
+    words = [rng.choice(FILLER) for _ in range(n)]
+    for word in mentions:
+        words.insert(rng.randrange(len(words) + 1), word)
+    return " ".join(words)
+
+
+def apify_item(rng: random.Random, published_at: datetime) -> dict:
+    """One raw item shaped like the Upwork extractor's dataset output."""
+    job_type = rng.choice(["FIXED", "HOURLY"])
+    skills = rng.sample(SKILLS, rng.randint(2, 6))
+    topic = rng.sample(WORDS, 2)
+    item = {
+        "title": f"{skills[0]} {topic[0]} {topic[1]}".capitalize(),
+        "url": f"https://www.upwork.com/jobs/~0{rng.getrandbits(60):018d}",
+        "type": job_type,
+        "description": _sentence(rng, rng.randint(40, 250), [s.lower() for s in skills[:3]] + topic),
+        "category": {"name": rng.choice(CATEGORIES)},
+        "skills": [{"name": s} for s in skills],
+        "buyer": {
+            "location": {"country": rng.choice(COUNTRIES)},
+            "stats": {
+                "totalCharges": {"amount": round(rng.uniform(0, 200000), 2)},
+                "score": round(rng.uniform(3, 5), 2) if rng.random() > 0.2 else None,
+            },
+        },
+        "ts_publish": published_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }
+    if job_type == "FIXED":
+        item["fixed"] = {"budget": {"amount": rng.choice([50, 100, 250, 500, 1000, 5000])}}
+    else:
+        item["hourly"] = {"min": 15, "max": rng.choice([25, 40, 60, 100])}
+    return item
+
+
+def apify_items(count: int, seed: int = 1, minutes: int = 10) -> list[dict]:
+    """`count` items published within the last `minutes` (so they are inside the alert window)."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    return [apify_item(rng, now - timedelta(seconds=rng.uniform(0, minutes * 60))) for _ in range(count)]
+
+
+def subscribers(count: int, seed: int = 2, filters_per_user=(1, 3)) -> dict:
+    """
+    Supabase tables for `count` eligible users: profiles, filters, filter_keywords,
+    filter_categories and filter_skills rows, shaped like the real tables.
+    """
+    rng = random.Random(seed)
+    # Separate stream, so the skill rows do not shift the rest of the generated data
+    skill_rng = random.Random(seed + 1)
+    created = datetime(2025, 1, 1)
+    tables = {"profiles": [], "filters": [], "filter_keywords": [], "filter_categories": [], "filter_skills": []}
+    filter_id = 0
+    for n in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        tables["profiles"].append({
+            "id": user_id,
+            "telegram_id": str(100000000 + n),
+            "is_paid": True,
+            "trial_end": None,
+        })
+        for _ in range(rng.randint(*filters_per_user)):
+            filter_id += 1
+            tables["filters"].append({
+                "id": filter_id,
+                "user_id": user_id,
+                "name": f"filter {filter_id}",
+                "min_price": rng.choice([None, None, 50, 100]),
+                "max_price": rng.choice([None, None, None, 5000]),
+                "created_at": (created + timedelta(seconds=filter_id)).isoformat(),
+            })
+            for keyword in rng.sample(SKILLS, rng.randint(1, 3)):
+                tables["filter_keywords"].append({"filter_id": filter_id, "keyword": keyword.lower()})
+            for category in rng.sample(CATEGORIES, rng.randint(1, 2)):
+                tables["filter_categories"].append({"filter_id": filter_id, "category": category})
+            if skill_rng.random() < 0.3:
+                for skill in skill_rng.sample(SKILLS, skill_rng.randint(1, 3)):
+                    tables["filter_skills"].append({"filter_id": filter_id, "skill": skill})
+    return tables
+
+
+def users_with_filters(tables: dict) -> list[dict]:
+    """The in-memory shape the subscriber registry builds from the tables above."""
+    keywords, categories, skills, filters_by_user = {}, {}, {}, {}
+    for row in tables["filter_keywords"]:
+        keywords.setdefault(row["filter_id"], []).append(row["keyword"])
+    for row in tables["filter_categories"]:
+        categories.setdefault(row["filter_id"], []).append(row["category"])
+    for row in tables["filter_skills"]:
+        skills.setdefault(row["filter_id"], []).append(row["skill"])
+    for f in tables["filters"]:
+        filters_by_user.setdefault(f["user_id"], []).append({
+            "id": f["id"],
+            "user_id": f["user_id"],
+            "name": f["name"],
+            "min_price": f["min_price"],
+            "max_price": f["max_price"],
+            "keywords": keywords.get(f["id"], []),
+            "categories": categories.get(f["id"], []),
+            "skills": skills.get(f["id"], []),
+        })
+    return [
+        {"user_id": p["id"], "telegram_id": p["telegram_id"], "delivery_mode": "instant",
+         "filters": filters_by_user.get(p["id"], [])}
+        for p in tables["profiles"]
+    ]
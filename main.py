@@ -1,19 +1,37 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from apscheduler.schedulers.background import BackgroundScheduler
 from utils.logger import setup_logging
 from background_tasks.scheduler import start_scheduler
+from services.coordination import stop_coordination
+from services.outbox import workers as outbox_workers
 from services.apify_scrapper import fetch_upwork_jobs_from_apify
 import logging
+import asyncio
+from sqlalchemy import text
 from routers import jobs
-from services.postgres import save_jobs, setup_database
+from services.container import container
+from services.postgres import ensure_schema
+from services.postgres_async import save_jobs, get_async_engine, load_recent_jobs
+from services.recent_jobs import RECENT_JOBS_MODE
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
 import os
 from routers.telegram import router as telegram_router
+from services.telegram_link import TELEGRAM_BOT_MODE, register_webhook
+from services.metrics import HTTP_REQUEST_DURATION, metrics_response
+
+container.record("import", time.perf_counter() - _import_started)
 
-load_dotenv()
+# Built and warmed before the instance reports ready; everything else is created on first use
+WARM_UP_SERVICES = ["postgres", "postgres_async"]
+STARTUP_RETRY_SECONDS = 5
+READINESS_TIMEOUT_SECONDS = 2
 
 app = FastAPI()
+app.state.ready = False
 
 # Get allowed origins from env, split by comma
 origins = os.getenv("ALLOWED_ORIGINS", "").split(",")
@@ -27,24 +45,106 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /api/fetch_filtered_jobs), not the raw URL
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
+
+
 #Testing
 @app.get("/ping")
 async def ping():
     jobs = await fetch_upwork_jobs_from_apify()
     if jobs:
-        save_jobs(jobs)
-        logging.info(f"[Scheduler] saved {len(jobs)} jobs")
+        new_ids = await save_jobs(jobs)
+        logging.info(f"[Scheduler] saved {len(new_ids)} new of {len(jobs)} jobs")
     else:
         logging.error("[Scheduler] No jobs fetched")
 
     return {"message": jobs}
 
 
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    # Liveness: the process is up and serving; no dependencies are touched
+    return {"status": "ok"}
+
+
+async def ping_database():
+    async with get_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        # The timeout covers pool checkout and connecting too, so an unreachable database fails fast
+        await asyncio.wait_for(ping_database(), READINESS_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return JSONResponse({"status": "database unavailable", "error": f"no answer within {READINESS_TIMEOUT_SECONDS}s"}, status_code=503)
+    except Exception as e:
+        return JSONResponse({"status": "database unavailable", "error": str(e)}, status_code=503)
+    return {"status": "ready", "startup_ms": {phase: round(s * 1000) for phase, s in container.timings.items()}}
+
+
+async def warm_start():
+    """Schema check, service warm-up and scheduler start, off the startup path so the server accepts traffic at once."""
+    started = time.perf_counter()
+    while True:
+        try:
+            phase_started = time.perf_counter()
+            await asyncio.to_thread(ensure_schema)
+            container.record("schema", time.perf_counter() - phase_started)
+            await container.warm_up(WARM_UP_SERVICES)
+            if RECENT_JOBS_MODE == "memory":
+                phase_started = time.perf_counter()
+                await load_recent_jobs()
+                container.record("recent_jobs", time.perf_counter() - phase_started)
+            break
+        except Exception as e:
+            logging.error(f"[Startup] Not ready, retrying in {STARTUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+    start_scheduler()
+    if TELEGRAM_BOT_MODE == "webhook":
+        try:
+            await register_webhook()
+        except Exception as e:
+            logging.error(f"[Startup] Telegram webhook registration failed: {e}")
+    container.record("startup", time.perf_counter() - started)
+    app.state.ready = True
+    logging.info(f"[Startup] Ready: {container.report()}")
+
+
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     setup_logging()
-    setup_database()
-    start_scheduler()
+    app.state.warm_start = asyncio.create_task(warm_start())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.warm_start.cancel()
+    await outbox_workers.stop()
+    await stop_coordination()
+    await container.close_all()
 
 
 app.include_router(jobs.router, prefix="/api")
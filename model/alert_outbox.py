@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Identity, Index, Text, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import datetime
+from model.job import Base  # Use the same Base as Job
+
+class AlertOutbox(Base):
+    """Matched alerts waiting for delivery; rows move to job_alerts once Telegram accepts them."""
+    __tablename__ = "alert_outbox"
+    id = Column(BigInteger, Identity(), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    job_id = Column(String, nullable=False)
+    chat_id = Column(String, nullable=False)
+    mode = Column(String, nullable=False, default="instant")  # instant | digest
+    payload = Column(JSONB, nullable=False)  # the job fields the message is rendered from
+    status = Column(String, nullable=False, default="pending")  # pending | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_error = Column(Text)
+
+    __table_args__ = (
+        # One queued (or dead) alert per user/job; delivered rows are deleted
+        Index("ux_alert_outbox_user_job", "user_id", "job_id", unique=True),
+        # Workers' due-row scan
+        Index("ix_alert_outbox_due", "available_at", "user_id", "id", postgresql_where=text("status = 'pending'")),
+    )
@@ -16,6 +16,7 @@ class Filter(Base):
     created_at = Column(DateTime)
     keywords = relationship("FilterKeyword", back_populates="filter")
     categories = relationship("FilterCategory", back_populates="filter")
+    skills = relationship("FilterSkill", back_populates="filter")
 
 class FilterKeyword(Base):
     __tablename__ = "filter_keywords"
@@ -31,6 +32,13 @@ class FilterCategory(Base):
     category = Column(String)
     filter = relationship("Filter", back_populates="categories")
 
+class FilterSkill(Base):
+    __tablename__ = "filter_skills"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    filter_id = Column(UUID(as_uuid=True), ForeignKey("filters.id"), nullable=False)
+    skill = Column(String)
+    filter = relationship("Filter", back_populates="skills")
+
 class Profile(Base):
     __tablename__ = "profiles"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
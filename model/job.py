@@ -1,8 +1,13 @@
-from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy import Column, String, Float, DateTime, BigInteger, Identity, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 
 Base = declarative_base()
 
+# 'simple' keeps words as-is (no stemming), so word matching stays literal
+SEARCH_VECTOR_SQL = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
 class Job(Base):
     __tablename__ = "jobs"
 
@@ -12,9 +17,26 @@ class Job(Base):
     category = Column(String)
     type = Column(String)
     description = Column(String)
-    skills = Column(String)  # store as comma-separated string for now
+    skills = Column(ARRAY(String))
     budget = Column(Float)
     location = Column(String)
     client_spend = Column(Float)
     client_rating = Column(Float)
-    published_at = Column(DateTime)
+    published_at = Column(DateTime, primary_key=True)  # partition key, so it has to be part of the key
+    ingest_seq = Column(BigInteger, Identity(), nullable=False, index=True)  # insertion order, drives the alert cursor
+    # Filled at ingest by services/enrichment.py: lowercased title and description, and their word tokens
+    search_text = Column(String)
+    tokens = Column(ARRAY(String))
+    skill_keys = Column(ARRAY(String))  # lowercased skills, what skill filters match against
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+    __table_args__ = (
+        Index("ix_jobs_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_jobs_published_at", "published_at"),
+        Index("ix_jobs_category_published_at", "category", "published_at"),
+        Index("ix_jobs_type", "type"),
+        Index("ix_jobs_location", "location"),
+        Index("ix_jobs_skill_keys", "skill_keys", postgresql_using="gin"),
+        # Daily partitions (services/partitions.py); recency filters only touch the newest ones
+        {"postgresql_partition_by": "RANGE (published_at)"},
+    )
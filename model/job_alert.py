@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Identity, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
@@ -6,7 +6,22 @@ from model.job import Base  # Use the same Base as Job
 
 class JobAlert(Base):
     __tablename__ = "job_alerts"
-    id = Column(Integer, primary_key=True)
+    id = Column(BigInteger, Identity(), primary_key=True)
     user_id = Column(UUID(as_uuid=True), nullable=False)
     job_id = Column(String, nullable=False)
-    sent_at = Column(DateTime, default=datetime.datetime.utcnow) 
\ No newline at end of file
+    sent_at = Column(DateTime, primary_key=True, default=datetime.datetime.utcnow)  # partition key
+
+    __table_args__ = (
+        # Dedup lookups; uniqueness is enforced by record_job_alerts since a
+        # partitioned table can only have unique keys that include sent_at
+        Index("ix_job_alerts_user_job", "user_id", "job_id"),
+        {"postgresql_partition_by": "RANGE (sent_at)"},
+    )
+
+class JobAlertCount(Base):
+    """Alerts sent per user per hour, kept in step with job_alerts for cheap rate checks."""
+    __tablename__ = "job_alert_counts"
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+ 
\ No newline at end of file
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime, BigInteger
+import datetime
+from model.job import Base  # Use the same Base as Job
+
+class PipelineCursor(Base):
+    __tablename__ = "pipeline_cursors"
+    name = Column(String, primary_key=True)
+    position = Column(BigInteger, nullable=False)  # last processed jobs.ingest_seq
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
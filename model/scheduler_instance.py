@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime
+import datetime
+from model.job import Base  # Use the same Base as Job
+
+class SchedulerInstance(Base):
+    __tablename__ = "scheduler_instances"
+    instance_id = Column(String, primary_key=True)
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
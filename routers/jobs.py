@@ -1,42 +1,163 @@
 from fastapi import APIRouter, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, func, tuple_, cast, select
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from typing import List, Optional
+import base64
+import json
 from datetime import datetime, timedelta
 from fastapi import Depends
-from services.postgres import SessionLocal
+from services.postgres_async import get_async_session
 from model.job import Job
 from utils.authcheck import verify_api_key
+from services.query_cache import filtered_jobs_cache, get_data_generation
+from services.recent_jobs import recent_jobs
+from services.enrichment import skill_keys
 
 router = APIRouter()
 
+JOB_FIELDS = {
+    "id": Job.id,
+    "title": Job.title,
+    "url": Job.url,
+    "budget": Job.budget,
+    "published_at": Job.published_at,
+    "category": Job.category,
+    "type": Job.type,
+    "description": Job.description,
+    "skills": Job.skills,
+    "location": Job.location,
+    "client_rating": Job.client_rating,
+    "client_spend": Job.client_spend,
+}
+DEFAULT_FIELDS = [field for field in JOB_FIELDS if field != "id"]
+
+def encode_cursor(values) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, ranked: bool):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != (3 if ranked else 2):
+            raise ValueError("cursor does not match the requested ordering")
+        # [rank,] published_at, id
+        values[-2] = datetime.fromisoformat(values[-2])
+        return values
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def can_serve_from_memory(keywords, match_mode, rank) -> bool:
+    # Word matching and ranking need Postgres' text search; ILIKE wildcards in a keyword
+    # would change its meaning, so those queries go to the database too
+    if not recent_jobs.fresh() or match_mode != "substring" or (rank and keywords):
+        return False
+    return not any(ch in kw for kw in keywords for ch in "%_\\")
+
+def search_recent_jobs(since, categories, keywords, client_locations, exclude_locations,
+                       min_client_rating, job_types, skills, skills_match, limit, after, selected_fields,
+                       include_total):
+    """The filtered-jobs query answered from the in-memory recent-jobs window, with the same ordering and paging."""
+    matches = recent_jobs.search(
+        since, categories, keywords, client_locations, exclude_locations, min_client_rating, job_types,
+        skills, skills_match,
+    )
+    total_matches = len(matches) if include_total else None
+    if after is not None:
+        after_key = (after[0], after[1])
+        matches = [record for record in matches if (record.published_at, record.id) < after_key]
+    rows = matches[:limit + 1]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].published_at, rows[-1].id])
+    results = []
+    for record in rows:
+        results.append({field: getattr(record, field) for field in selected_fields})
+    return {"matches": results, "total_matches": total_matches, "next_cursor": next_cursor}
+
+def keyword_tsquery(keyword: str):
+    # Same 'simple' configuration as Job.search_vector; multi-word keywords match as a phrase
+    return func.phraseto_tsquery("simple", keyword)
+
 @router.get("/fetch_filtered_jobs")
-def fetch_filtered_jobs(
+async def fetch_filtered_jobs(
     keywords: List[str] = Query(default=[]),
     categories: List[str] = Query(default=[]),
     client_locations: List[str] = Query(default=[]),  # Locations to include
     exclude_locations: List[str] = Query(default=[]), # Locations to exclude
     min_client_rating: float = Query(default=None),   # Minimum client rating
     job_types: List[str] = Query(default=[]),         # Job types (HOURLY, FIXED)
+    skills: List[str] = Query(default=[]),            # Skills (List or CSV), case-insensitive
+    skills_match: str = Query(default="any", pattern="^(any|all)$"),  # Jobs with any or all of the skills
+    match_mode: str = Query(default="substring", pattern="^(substring|word)$"),  # How keywords match
+    rank: bool = Query(default=False),                # Order by keyword relevance first
+    limit: int = Query(default=100, ge=1, le=500),    # Page size
+    cursor: Optional[str] = Query(default=None),      # next_cursor from the previous page
+    fields: List[str] = Query(default=[]),            # Columns to return (default: all)
+    include_total: bool = Query(default=True),        # Skip the total count when False (first page only)
     _ = Depends(verify_api_key)
 ):
-    session: Session = SessionLocal()
+    session: AsyncSession = get_async_session()
     try:
         # Categories are mandatory
         if not categories:
             raise HTTPException(status_code=400, detail="Categories parameter is required")
+
+        selected_fields = [f.strip() for field in fields for f in field.split(",") if f.strip()] or DEFAULT_FIELDS
+        unknown = [f for f in selected_fields if f not in JOB_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+        keywords = [kw.strip() for kw in keywords if kw.strip()]
+        # Lowercased, deduplicated and sorted, as jobs.skill_keys is
+        skills = skill_keys(skill for value in skills for skill in value.split(","))
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, ranked=bool(rank and keywords))
+            # Counting every match on each page would undo keyset paging; the first page has the total
+            include_total = False
+
+        # Keywords match case-insensitively in both modes, so they are folded; the other
+        # lists are exact SQL matches and are only deduplicated and sorted
+        cache_key = (
+            tuple(sorted(set(kw.casefold() for kw in keywords))),
+            tuple(sorted(set(categories))),
+            tuple(sorted(set(client_locations))),
+            tuple(sorted(set(exclude_locations))),
+            min_client_rating,
+            tuple(sorted(set(job_types))),
+            tuple(skills), skills_match,
+            match_mode, rank, limit, cursor, tuple(selected_fields), include_total,
+        )
+        # Read the generation before querying so a concurrent insert invalidates this result
+        generation = get_data_generation()
+        cached = filtered_jobs_cache.get(cache_key, generation)
+        if cached is not None:
+            return cached
+
+        if can_serve_from_memory(keywords, match_mode, rank):
+            response = search_recent_jobs(
+                datetime.utcnow() - timedelta(days=1), categories, keywords, client_locations, exclude_locations,
+                min_client_rating, job_types, skills, skills_match, limit, after, selected_fields, include_total,
+            )
+            filtered_jobs_cache.put(cache_key, generation, response)
+            return response
         
-        query = session.query(Job)
+        query = select(Job)
         
         # First filter by categories (mandatory)
-        query = query.filter(Job.category.in_(categories))
+        query = query.where(Job.category.in_(categories))
         
         # If keywords are provided, add keyword filtering with AND condition
         if keywords:
             keyword_conditions = []
             for kw in keywords:
-                kw = kw.strip()
-                if kw:
+                if match_mode == "word":
+                    # Whole words/phrases, served by the GIN index on search_vector
+                    keyword_conditions.append(Job.search_vector.op("@@")(keyword_tsquery(kw)))
+                else:
+                    # Substrings, served by the pg_trgm indexes on title and description
                     keyword_conditions.append(
                         or_(
                             Job.title.ilike(f"%{kw}%"),
@@ -45,57 +166,88 @@ def fetch_filtered_jobs(
                     )
             
             # Apply keyword conditions with AND logic
-            if keyword_conditions:
-                query = query.filter(and_(*keyword_conditions))
+            query = query.where(and_(*keyword_conditions))
 
         # Apply client location include filter if provided
         if client_locations:
-            query = query.filter(Job.location.in_(client_locations))
+            query = query.where(Job.location.in_(client_locations))
 
         # Apply client location exclude filter if provided
         if exclude_locations:
-            query = query.filter(~Job.location.in_(exclude_locations))
+            query = query.where(~Job.location.in_(exclude_locations))
 
         # Apply minimum client rating filter if provided
         if min_client_rating is not None:
-            query = query.filter(Job.client_rating >= min_client_rating)
+            query = query.where(Job.client_rating >= min_client_rating)
 
         # Apply job type filter if provided
         if job_types:
-            query = query.filter(Job.type.in_(job_types))
+            query = query.where(Job.type.in_(job_types))
+
+        # Skills, served by the GIN index on skill_keys: && for any, @> for all
+        if skills:
+            if skills_match == "all":
+                query = query.where(Job.skill_keys.contains(skills))
+            else:
+                query = query.where(Job.skill_keys.overlap(skills))
 
         # Limit to last 1 day
         one_day_ago = datetime.utcnow() - timedelta(days=1)
-        query = query.filter(Job.published_at >= one_day_ago)
-
-        matches = query.order_by(Job.published_at.desc()).all()
-        total_matches = query.count()
-
-        results = [
-            {
-                "title": job.title,
-                "url": job.url,
-                "budget": job.budget,
-                "published_at": job.published_at,
-                "category": job.category,
-                "type": job.type,
-                "description": job.description,  # Limit description length
-                "skills": job.skills.split(",") if job.skills is not None else [],
-                "location": job.location,
-                "budget": job.budget,
-                "client_rating": job.client_rating,
-                "client_spend": job.client_spend
-
-            }
-            for job in matches
-        ]
-
-        return {
+        query = query.where(Job.published_at >= one_day_ago)
+
+        # Sort keys double as the keyset and are always selected so the next cursor can be built
+        sort_keys = [Job.published_at.label("_published_at"), Job.id.label("_id")]
+        if rank and keywords:
+            any_keyword = keyword_tsquery(keywords[0])
+            for kw in keywords[1:]:
+                any_keyword = any_keyword.op("||")(keyword_tsquery(kw))
+            # float8 so the value round-trips through the cursor exactly
+            sort_keys.insert(0, cast(func.ts_rank_cd(Job.search_vector, any_keyword), DOUBLE_PRECISION).label("_rank"))
+
+        # Only the requested columns are selected
+        columns = [JOB_FIELDS[field].label(field) for field in selected_fields]
+        page = query.with_only_columns(*columns, *sort_keys).subquery()
+        page_keys = [page.c[key.name] for key in sort_keys]
+
+        page_query = select(page)
+        if after is not None:
+            page_query = page_query.where(tuple_(*page_keys) < tuple_(*after))
+        page_query = page_query.order_by(*[key.desc() for key in page_keys]).limit(limit + 1)
+        rows = (await session.execute(page_query)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([getattr(rows[-1], key.name) for key in sort_keys])
+
+        total_matches = None
+        if include_total:
+            # A separate count keeps the page query a top-N over the index order
+            total_matches = (await session.execute(query.with_only_columns(func.count()))).scalar()
+
+        results = []
+        for row in rows:
+            result = {field: getattr(row, field) for field in selected_fields}
+            if "skills" in result and result["skills"] is None:
+                result["skills"] = []
+            results.append(result)
+
+        response = {
             "matches": results,
-            "total_matches": total_matches
+            "total_matches": total_matches,
+            "next_cursor": next_cursor
         }
+        filtered_jobs_cache.put(cache_key, generation, response)
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        session.close()
+        await session.close()
+
+
+@router.get("/cache_stats")
+def cache_stats(_ = Depends(verify_api_key)):
+    return filtered_jobs_cache.stats()
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Header, BackgroundTasks
 from pydantic import BaseModel
+from typing import Optional
+import hmac
 import logging
-from services.supabase import update_user_telegram_id
+from services.telegram_link import (
+    link_telegram_account, handle_update, TELEGRAM_BOT_MODE, TELEGRAM_WEBHOOK_SECRET,
+)
 
 router = APIRouter()
 
@@ -11,15 +15,29 @@ class TelegramLinkRequest(BaseModel):
 
 @router.post("/api/link-telegram")
 async def link_telegram(req: TelegramLinkRequest):
+    user_id = req.user_token
     try:
-        user_id = req.user_token
-        response = update_user_telegram_id(user_id, req.chat_id)
-        if response.data:
-            logging.info(f"Linked chat_id {req.chat_id} to user_id {user_id}")
-            return {"status": "success"}
-        else:
-            logging.error(f"No profile found for user_id {user_id}")
-            raise HTTPException(status_code=404, detail="User not found")
+        linked = await link_telegram_account(user_id, req.chat_id)
     except Exception as e:
         logging.error(f"Failed to link Telegram: {e}")
-        raise HTTPException(status_code=500, detail="Failed to link Telegram") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to link Telegram")
+    if not linked:
+        logging.error(f"No profile found for user_id {user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
+    logging.info(f"Linked chat_id {req.chat_id} to user_id {user_id}")
+    return {"status": "success"}
+
+@router.post("/api/telegram/webhook")
+async def telegram_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    secret_token: Optional[str] = Header(default=None, alias="X-Telegram-Bot-Api-Secret-Token"),
+):
+    if TELEGRAM_BOT_MODE != "webhook":
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(secret_token or "", TELEGRAM_WEBHOOK_SECRET):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    update = await request.json()
+    # Acknowledge at once; Telegram holds back further updates until this returns
+    background_tasks.add_task(handle_update, update)
+    return {"ok": True}
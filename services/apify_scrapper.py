@@ -1,15 +1,29 @@
 import os
+import re
+import json
+import time
 import httpx
 import logging
-from typing import List, Dict
-from dotenv import load_dotenv
+from typing import List, Dict, Optional
 from datetime import datetime
 import traceback
-
-load_dotenv()
+from services.container import container
+from services.metrics import CRAWL_ITEMS
 
 APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
 APIFY_URL = "https://api.apify.com/v2/actor-tasks/vigorous_juggernaut~upwork-extractor-task/run-sync-get-dataset-items"
+APIFY_API_URL = "https://api.apify.com/v2"
+APIFY_TASK_ID = "vigorous_juggernaut~upwork-extractor-task"
+APIFY_PAGE_SIZE = int(os.getenv("APIFY_PAGE_SIZE", "500"))
+APIFY_RUN_TIMEOUT_SECONDS = int(os.getenv("APIFY_RUN_TIMEOUT_SECONDS", "300"))
+# Apify holds each run request open for up to this long; the client's read timeout must exceed it
+APIFY_WAIT_SECONDS = 60
+# How far back already-ingested IDs are remembered, and how often that set is re-read from the DB
+SEEN_ID_WINDOW_HOURS = int(os.getenv("APIFY_SEEN_ID_WINDOW_HOURS", "48"))
+SEEN_ID_RESEED_SECONDS = int(os.getenv("APIFY_SEEN_ID_RESEED_SECONDS", "600"))
+
+# Cheap pre-parse probe for the job URL in a raw JSONL line
+_URL_PROBE = re.compile(r'"url"\s*:\s*"([^"]*)"')
 
 async def fetch_upwork_jobs_from_apify() -> List[Dict]:
     headers = { "Accept": "application/json" }
@@ -28,33 +42,8 @@ async def fetch_upwork_jobs_from_apify() -> List[Dict]:
 
             # logging.info(f"[Crawler] Jobs data: {data}")
 
-            jobs = []
-            for item in data:
-                job = {
-                    "title": item.get("title", ""),
-                    "url": item.get("url", ""),
-                    "type": item.get("type", ""),
-                    "description": item.get("description", ""),
-                    "category": item.get("category", {}).get("name") or "uncategorized",
-                    "skills": [s.get("name", "") for s in item.get("skills") or []],
-                    "budget": (
-                        item.get("fixed") and item["fixed"].get("budget") and item["fixed"]["budget"].get("amount")
-                    ) if item.get("type") == "FIXED" else (
-                        item.get("hourly") and item["hourly"].get("max")
-                    ),
-                    "location": (
-                        item.get("buyer") and item["buyer"].get("location") and item["buyer"]["location"].get("country")
-                    ),
-                    "client_spend": (
-                        ((item.get("buyer") or {}).get("stats") or {}).get("totalCharges") or {}
-                    ).get("amount"),
-                    "client_rating": (
-                        item.get("buyer") and item["buyer"].get("stats") and item["buyer"]["stats"].get("score")
-                    ),
-                    "published_at": format_publish_time(item.get("ts_publish", ""))
-                }
-                jobs.append(job)
-
+            jobs = [normalize_item(item) for item in data]
+            CRAWL_ITEMS.labels("fetched").inc(len(jobs))
 
             logging.info(f"[Crawler] Fetched {len(jobs)} jobs")
             return jobs
@@ -65,9 +54,174 @@ async def fetch_upwork_jobs_from_apify() -> List[Dict]:
         return []
 
 
+def normalize_item(item: dict) -> Dict:
+    return {
+        "title": item.get("title", ""),
+        "url": item.get("url", ""),
+        "type": item.get("type", ""),
+        "description": item.get("description", ""),
+        "category": item.get("category", {}).get("name") or "uncategorized",
+        "skills": [s.get("name", "") for s in item.get("skills") or []],
+        "budget": (
+            item.get("fixed") and item["fixed"].get("budget") and item["fixed"]["budget"].get("amount")
+        ) if item.get("type") == "FIXED" else (
+            item.get("hourly") and item["hourly"].get("max")
+        ),
+        "location": (
+            item.get("buyer") and item["buyer"].get("location") and item["buyer"]["location"].get("country")
+        ),
+        "client_spend": (
+            ((item.get("buyer") or {}).get("stats") or {}).get("totalCharges") or {}
+        ).get("amount"),
+        "client_rating": (
+            item.get("buyer") and item["buyer"].get("stats") and item["buyer"]["stats"].get("score")
+        ),
+        "published_at": format_publish_time(item.get("ts_publish", ""))
+    }
+
+
+def upwork_id(url: str) -> str:
+    # Same key save_jobs stores as jobs.id
+    return url.split("~")[-1]
+
+
 def format_publish_time(iso_str: str) -> str:
     try:
         dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
         return dt.strftime("%Y-%m-%d %H:%M:%S")
     except:
-        return ""
\ No newline at end of file
+        return ""
+
+class SeenJobIds:
+    """IDs known to be stored in Postgres, used to skip items before parsing them."""
+
+    def __init__(self):
+        self.ids = {}  # id -> monotonic time it was last confirmed
+        self.seeded_at = None
+
+    def __contains__(self, job_id):
+        return job_id in self.ids
+
+    def remember(self, ids):
+        now = time.monotonic()
+        for job_id in ids:
+            self.ids[job_id] = now
+
+    async def refresh(self, load_recent_ids):
+        now = time.monotonic()
+        if self.seeded_at is not None and now - self.seeded_at < SEEN_ID_RESEED_SECONDS:
+            return
+        # Reseeding also picks up rows inserted by other processes
+        self.remember(await load_recent_ids(SEEN_ID_WINDOW_HOURS))
+        cutoff = now - SEEN_ID_WINDOW_HOURS * 3600
+        self.ids = {job_id: seen for job_id, seen in self.ids.items() if seen >= cutoff}
+        self.seeded_at = now
+
+
+seen_job_ids = SeenJobIds()
+container.register(
+    "apify",
+    lambda: httpx.AsyncClient(
+        base_url=APIFY_API_URL,
+        params={"token": APIFY_API_TOKEN},
+        timeout=httpx.Timeout(APIFY_WAIT_SECONDS + 15, connect=10),
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=120),
+    ),
+    close=lambda client: client.aclose(),
+)
+
+
+def get_apify_client() -> httpx.AsyncClient:
+    return container.get("apify")
+
+
+async def close_apify_client():
+    await container.close("apify")
+
+
+async def _abort_run(client: httpx.AsyncClient, run_id: str):
+    # A run nobody collects keeps using Apify compute until it finishes on its own
+    try:
+        res = await client.post(f"/actor-runs/{run_id}/abort")
+        res.raise_for_status()
+        logging.warning(f"[Crawler] Aborted Apify run {run_id}")
+    except httpx.HTTPError as e:
+        logging.error(f"[Crawler] Failed to abort Apify run {run_id}: {e}")
+
+
+async def _run_task(client: httpx.AsyncClient) -> Optional[Dict]:
+    res = await client.post(f"/actor-tasks/{APIFY_TASK_ID}/runs", params={"waitForFinish": APIFY_WAIT_SECONDS})
+    res.raise_for_status()
+    run = res.json()["data"]
+    deadline = time.monotonic() + APIFY_RUN_TIMEOUT_SECONDS
+    try:
+        while run["status"] in ("READY", "RUNNING"):
+            if time.monotonic() > deadline:
+                logging.error(f"[Crawler] Apify run {run['id']} did not finish in {APIFY_RUN_TIMEOUT_SECONDS}s")
+                await _abort_run(client, run["id"])
+                return None
+            res = await client.get(f"/actor-runs/{run['id']}", params={"waitForFinish": APIFY_WAIT_SECONDS})
+            res.raise_for_status()
+            run = res.json()["data"]
+    except Exception:
+        await _abort_run(client, run["id"])
+        raise
+    if run["status"] != "SUCCEEDED":
+        logging.error(f"[Crawler] Apify run {run['id']} ended with status {run['status']}")
+        return None
+    return run
+
+
+async def fetch_new_upwork_jobs_from_apify(load_recent_ids) -> List[Dict]:
+    """
+    Run the Apify task, then stream its dataset page by page as JSON lines. Items whose
+    Upwork ID was already ingested are skipped before they are parsed or normalised, so
+    the cost of a crawl follows the number of new jobs rather than the dataset size.
+    `load_recent_ids(hours)` seeds the seen-ID set from the database.
+    """
+    try:
+        await seen_job_ids.refresh(load_recent_ids)
+        client = get_apify_client()
+        logging.info("[Crawler] Fetching Upwork jobs from Apify...")
+        run = await _run_task(client)
+        if run is None:
+            return []
+
+        jobs = []
+        total = 0
+        offset = 0
+        while True:
+            page_items = 0
+            async with client.stream(
+                "GET",
+                f"/datasets/{run['defaultDatasetId']}/items",
+                params={"format": "jsonl", "clean": "true", "offset": offset, "limit": APIFY_PAGE_SIZE},
+            ) as res:
+                res.raise_for_status()
+                async for line in res.aiter_lines():
+                    if not line.strip():
+                        continue
+                    page_items += 1
+                    probe = _URL_PROBE.search(line)
+                    if probe and upwork_id(probe.group(1)) in seen_job_ids:
+                        continue
+                    item = json.loads(line)
+                    if upwork_id(item.get("url") or "") in seen_job_ids:
+                        continue
+                    jobs.append(normalize_item(item))
+            total += page_items
+            if page_items < APIFY_PAGE_SIZE:
+                break
+            offset += APIFY_PAGE_SIZE
+
+        CRAWL_ITEMS.labels("fetched").inc(total)
+        CRAWL_ITEMS.labels("skipped_seen").inc(total - len(jobs))
+        if not total:
+            logging.warning("[Crawler] No jobs found.")
+        logging.info(f"[Crawler] Streamed {total} items, {len(jobs)} not seen before")
+        return jobs
+
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        logging.error(f"[Crawler] Error: {e}")
+        return []
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import inspect
+import logging
+import threading
+from dotenv import load_dotenv
+from services.metrics import STARTUP_SECONDS
+
+# The one place .env is read; every service module imports this one before reading settings
+load_dotenv()
+
+
+class ServiceContainer:
+    """
+    Shared clients (database engines, Supabase) built on first use instead of at import
+    time. Each registration can carry a warm-up hook, run ahead of traffic by warm_up(),
+    and a close hook; build, warm-up and startup phase times are kept for the startup report.
+    """
+
+    def __init__(self):
+        self._factories = {}  # name -> (factory, warm, close)
+        self._instances = {}
+        self._lock = threading.Lock()
+        self.timings = {}  # phase -> seconds
+
+    def register(self, name, factory, warm=None, close=None):
+        self._factories[name] = (factory, warm, close)
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            # Supabase calls run in worker threads, so two first uses can race
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name][0]()
+                self.record(f"init:{name}", time.perf_counter() - started)
+                self._instances[name] = instance
+        return instance
+
+    def initialized(self, name) -> bool:
+        return name in self._instances
+
+    async def warm_up(self, names=None):
+        """Build the named services (all by default) and run their warm-up hooks, e.g. opening a pool connection."""
+        for name in names or list(self._factories):
+            instance = await asyncio.to_thread(self.get, name)
+            warm = self._factories[name][1]
+            if warm is None:
+                continue
+            started = time.perf_counter()
+            try:
+                result = warm(instance)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.warning(f"[Startup] Warm-up of {name} failed: {e}")
+            self.record(f"warm:{name}", time.perf_counter() - started)
+
+    async def close(self, name):
+        instance = self._instances.pop(name, None)
+        close = self._factories[name][2] if name in self._factories else None
+        if instance is None or close is None:
+            return
+        result = close(instance)
+        if inspect.isawaitable(result):
+            await result
+
+    async def close_all(self):
+        # Reverse build order, so clients close before anything they were built on
+        for name in reversed(list(self._instances)):
+            try:
+                await self.close(name)
+            except Exception as e:
+                logging.warning(f"[Shutdown] Failed to close {name}: {e}")
+
+    def record(self, phase, seconds):
+        self.timings[phase] = seconds
+        STARTUP_SECONDS.labels(phase).set(seconds)
+
+    def report(self) -> str:
+        return ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.timings.items())
+
+
+container = ServiceContainer()
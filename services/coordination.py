@@ -0,0 +1,132 @@
+import os
+import socket
+import hashlib
+import logging
+from uuid import uuid4
+from sqlalchemy import text
+from services.postgres_async import get_async_engine, heartbeat_instance, remove_instance, purge_expired_instances
+
+# "postgres": one leader (advisory lock) crawls, alert fan-out is sharded across live instances
+# "off": every process does everything (single-instance deployments)
+SCHEDULER_COORDINATION = os.getenv("SCHEDULER_COORDINATION", "postgres")
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}"
+# An instance that misses this many seconds of heartbeats loses its share of users
+INSTANCE_TTL_SECONDS = int(os.getenv("INSTANCE_TTL_SECONDS", "150"))
+LEADER_LOCK = 7_210_002
+
+LOCK_SQL = text("SELECT pg_try_advisory_lock(:key)")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(:key)")
+
+
+class LeaderLock:
+    """
+    Session-level advisory lock held on a dedicated connection: whoever holds it is the
+    leader until it releases it or its connection dies, at which point Postgres frees the
+    lock and the next instance to try takes over.
+    """
+
+    def __init__(self, key: int):
+        self.key = key
+        self.conn = None
+
+    @property
+    def held(self) -> bool:
+        return self.conn is not None
+
+    async def acquire(self) -> bool:
+        if self.conn is not None:
+            try:
+                await self.conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                logging.warning(f"[Coordination] Lost leader connection: {e}")
+                await self._discard()
+        conn = await (await get_async_engine().connect()).execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = (await conn.execute(LOCK_SQL, {"key": self.key})).scalar()
+        except Exception:
+            await conn.invalidate()
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+        self.conn = conn
+        logging.info(f"[Coordination] {INSTANCE_ID} is now the leader")
+        return True
+
+    async def release(self):
+        if self.conn is None:
+            return
+        try:
+            await self.conn.execute(UNLOCK_SQL, {"key": self.key})
+            await self.conn.close()
+        except Exception:
+            await self._discard()
+        self.conn = None
+
+    async def _discard(self):
+        # Never hand a connection that may still hold the lock back to the pool
+        try:
+            await self.conn.invalidate()
+            await self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+
+
+def _weight(instance_id: str, user_id) -> bytes:
+    return hashlib.blake2b(f"{instance_id}:{user_id}".encode(), digest_size=8).digest()
+
+
+def owner_of(user_id, members) -> str:
+    """Rendezvous hashing: when an instance joins or leaves, only the users it gains or loses move."""
+    return max(members, key=lambda member: _weight(member, user_id))
+
+
+class Membership:
+    """This instance's view of the live instances and which users it owns."""
+
+    def __init__(self, instance_id: str, ttl_seconds: int):
+        self.instance_id = instance_id
+        self.ttl_seconds = ttl_seconds
+        self.members = (instance_id,)
+
+    async def heartbeat(self) -> bool:
+        """Refresh this instance's heartbeat; returns True when the set of live instances changed."""
+        members = tuple(await heartbeat_instance(self.instance_id, self.ttl_seconds)) or (self.instance_id,)
+        changed = members != self.members
+        if changed:
+            logging.info(f"[Coordination] {len(members)} live instances, sharding alerts across {members}")
+        self.members = members
+        return changed
+
+    def owned_users(self, users):
+        if len(self.members) == 1:
+            return users
+        return [user for user in users if owner_of(str(user["user_id"]), self.members) == self.instance_id]
+
+    async def leave(self):
+        await remove_instance(self.instance_id)
+
+    async def purge_expired(self):
+        # Rows of instances that died without leaving; far past the TTL so they are surely gone
+        await purge_expired_instances(self.ttl_seconds * 10)
+
+
+leader = LeaderLock(LEADER_LOCK)
+membership = Membership(INSTANCE_ID, INSTANCE_TTL_SECONDS)
+
+
+def coordination_enabled() -> bool:
+    return SCHEDULER_COORDINATION == "postgres"
+
+
+async def stop_coordination():
+    if not coordination_enabled():
+        return
+    await leader.release()
+    try:
+        await membership.leave()
+    except Exception as e:
+        logging.warning(f"[Coordination] Failed to leave membership: {e}")
@@ -0,0 +1,74 @@
+import os
+import re
+
+# How alert keywords match when a filter does not say: "substring" (default, same as the
+# API's match_mode) or "word", whole words only ("java" does not match "javascript")
+ALERT_KEYWORD_MATCH = os.getenv("ALERT_KEYWORD_MATCH", "substring")
+
+# Words, keeping the + and # of names like c++ and c#
+TOKEN_RE = re.compile(r"\w[\w+#]*")
+
+
+def normalize_text(title, description) -> str:
+    # Alert keywords match on this, as on `(title + ' ' + description).lower()` before enrichment
+    return f"{(title or '').lower()} {(description or '').lower()}"
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def enrich_job(job: dict) -> dict:
+    """Add the fields every consumer used to derive on its own: normalized text, word tokens and clean skills."""
+    search_text = normalize_text(job.get("title"), job.get("description"))
+    skills = [skill.strip() for skill in job.get("skills") or [] if skill and skill.strip()]
+    return {
+        **job,
+        "skills": skills,
+        "skill_keys": skill_keys(skills),
+        "search_text": search_text,
+        "tokens": sorted(set(tokenize(search_text))),
+    }
+
+
+def skill_keys(skills) -> list[str]:
+    # Skill filters compare case-insensitively
+    return sorted(set(skill.strip().lower() for skill in skills if skill and skill.strip()))
+
+
+def enrich_jobs(jobs: list[dict]) -> list[dict]:
+    return [enrich_job(job) for job in jobs]
+
+
+# Rows stored before enrichment existed have neither field; they leave the hot window within a day
+def job_search_text(job: dict) -> str:
+    return job.get("search_text") or normalize_text(job.get("title"), job.get("description"))
+
+
+def job_tokens(job: dict) -> frozenset:
+    tokens = job.get("tokens")
+    return frozenset(tokens if tokens is not None else tokenize(job_search_text(job)))
+
+
+def job_skill_keys(job: dict) -> frozenset:
+    keys = job.get("skill_keys")
+    return frozenset(keys if keys is not None else skill_keys(job.get("skills") or ()))
+
+
+def phrase_matches(words, tokens, search_text: str) -> bool:
+    """Whole-word match of a keyword's `words`: each is a job token and, like phraseto_tsquery, they follow one another in order."""
+    if not all(word in tokens for word in words):
+        return False
+    if len(words) < 2:
+        return True
+    words, job_words = list(words), tokenize(search_text)
+    return any(
+        job_words[i:i + len(words)] == words for i, word in enumerate(job_words) if word == words[0]
+    )
+
+
+def keyword_matches(keyword: str, search_text: str, tokens, mode: str) -> bool:
+    """`keyword` is already lowercased. In word mode its words must appear in the job as a run of whole words."""
+    if keyword not in search_text:
+        return False
+    return mode != "word" or phrase_matches(tokenize(keyword), tokens, search_text)
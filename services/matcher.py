@@ -0,0 +1,330 @@
+from collections import deque
+import numpy as np
+from services.enrichment import (
+    ALERT_KEYWORD_MATCH, tokenize, job_search_text, job_tokens, job_skill_keys, skill_keys, phrase_matches,
+)
+
+_ANY = object()
+# Filter × job cells evaluated at once by batch matching; larger cycles are split into blocks of jobs
+BATCH_MATCH_CELLS = 4_000_000
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over every lowercased filter keyword."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.patterns = {}
+
+    def add(self, keyword):
+        if keyword in self.patterns:
+            return self.patterns[keyword]
+        node = 0
+        for ch in keyword:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+                self.goto[node][ch] = nxt
+            node = nxt
+        pattern_id = len(self.patterns)
+        self.patterns[keyword] = pattern_id
+        self.out[node] = self.out[node] + (pattern_id,)
+        return pattern_id
+
+    def build(self):
+        queue = deque()
+        for nxt in self.goto[0].values():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # Fold the suffix outputs in so a scan never has to walk fail links for output
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def scan(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+def _vocabulary(values) -> dict:
+    # Code 0 stands for every value no filter names
+    codes = {}
+    for value in values:
+        codes.setdefault(value, len(codes) + 1)
+    return codes
+
+
+def _lookup_table(accepted, codes):
+    """(len(codes) + 1) × filters booleans: row `code` says which filters accept that value; None accepts any."""
+    table = np.zeros((len(codes) + 1, len(accepted)), dtype=bool)
+    for filter_id, values in enumerate(accepted):
+        if values is None:
+            table[:, filter_id] = True
+        else:
+            table[[codes[value] for value in values], filter_id] = True
+    return table
+
+
+class FilterColumns:
+    """
+    The non-text predicates of every compiled filter in columnar form: a lookup table per
+    dictionary-encoded job column (category, type, location, skills) and float bounds for
+    budget and rating. A block of jobs is encoded once and evaluated against all filters with a
+    handful of array operations, giving a jobs × filters mask.
+    """
+
+    def __init__(self, filters):
+        categories = [set(cat.lower() for cat in f['categories']) or None for f in filters]
+        job_types = [set(f.get('job_types') or ()) or None for f in filters]
+        include = [set(f.get('client_locations') or ()) or None for f in filters]
+        exclude = [set(f.get('exclude_locations') or ()) for f in filters]
+        skills = [set(skill_keys(f.get('skills') or ())) or None for f in filters]
+
+        self.category_codes = _vocabulary(value for values in categories if values for value in values)
+        self.type_codes = _vocabulary(value for values in job_types if values for value in values)
+        self.location_codes = _vocabulary(value for values in include + exclude if values for value in values)
+        self.skill_codes = _vocabulary(value for values in skills if values for value in values)
+        self.category = _lookup_table(categories, self.category_codes)
+        self.type = _lookup_table(job_types, self.type_codes)
+        self.include = _lookup_table(include, self.location_codes)
+        # Excluded locations are folded in, so one lookup answers both location predicates
+        self.location = self.include & ~_lookup_table(exclude, self.location_codes)
+        # Inverted skill -> filters index; row 0 holds the filters without skills, which accept any job
+        self.skill = _lookup_table(skills, self.skill_codes)
+        self.skill[1:, self.skill[0]] = False
+        self.has_skills = bool(self.skill_codes)
+
+        def bound(key, missing):
+            return np.array([missing if f.get(key) is None else f[key] for f in filters], dtype=float)
+        self.min_price = bound('min_price', -np.inf)
+        self.max_price = bound('max_price', np.inf)
+        self.min_rating = bound('min_client_rating', -np.inf)
+        self.bounded = bool(np.isfinite(self.min_price).any() or np.isfinite(self.max_price).any())
+        self.rated = bool(np.isfinite(self.min_rating).any())
+
+    def encode(self, jobs):
+        count = len(jobs)
+        categories = np.fromiter(
+            (self.category_codes.get((job.get('category') or '').lower(), 0) for job in jobs), dtype=np.intp, count=count
+        )
+        job_types = np.fromiter((self.type_codes.get(job.get('type'), 0) for job in jobs), dtype=np.intp, count=count)
+        locations = np.fromiter((self.location_codes.get(job.get('location'), 0) for job in jobs), dtype=np.intp, count=count)
+        budgets = np.fromiter((job.get('budget') or 0 for job in jobs), dtype=float, count=count)
+        # A job without a rating fails any minimum rating
+        ratings = np.fromiter(
+            (-np.inf if job.get('client_rating') is None else job['client_rating'] for job in jobs), dtype=float, count=count
+        )
+        # A job's known skills, plus code 0 so filters without skills come along
+        skills = [
+            [0] + [self.skill_codes[key] for key in job_skill_keys(job) if key in self.skill_codes] for job in jobs
+        ] if self.has_skills else None
+        return categories, job_types, locations, budgets, ratings, skills
+
+    def mask(self, encoded):
+        categories, job_types, locations, budgets, ratings, skills = encoded
+        mask = self.category[categories]
+        mask &= self.type[job_types]
+        mask &= self.location[locations]
+        if self.bounded:
+            mask &= budgets[:, None] >= self.min_price
+            mask &= budgets[:, None] <= self.max_price
+        if self.rated:
+            mask &= ratings[:, None] >= self.min_rating
+        if skills is not None:
+            for row, codes in enumerate(skills):
+                mask[row] &= self.skill[codes].any(axis=0)
+        return mask
+
+
+class FilterIndex:
+    """
+    Compiles every user filter once so each job is evaluated in a single pass.
+
+    Semantics are identical to match_jobs_to_filter: keywords are OR'ed over the job's
+    normalized text (substrings, or runs of whole words in word mode), categories are
+    case-insensitive, locations and job types are exact, price and rating are inclusive bounds,
+    and a filter listing skills needs the job to have at least one of them (case-insensitive).
+    """
+
+    def __init__(self, users):
+        self.users = list(users)
+        self.filters = []  # (user position, filter dict)
+        self.automaton = KeywordAutomaton()
+        self.keyword_filters = {}  # (pattern id, word mode) -> filter ids
+        self.pattern_tokens = {}  # pattern id -> the run of words a word-mode match needs
+        self.keyword_free = set()  # filters that pass the keyword check unconditionally
+        self.category_buckets = {}
+        self.type_buckets = {}
+        self.location_buckets = {}
+        self.exclude_buckets = {}
+        self.skill_buckets = {}  # lowercased skill -> filters listing it; _ANY -> filters without skills
+        self.bounded = set()  # filters with price or rating bounds
+        self._columns = None  # FilterColumns, built on the first batch match
+
+        for user_pos, user in enumerate(self.users):
+            for f in user['filters']:
+                self._add_filter(user_pos, f)
+        self.automaton.build()
+
+    def _add_filter(self, user_pos, f):
+        filter_id = len(self.filters)
+        self.filters.append((user_pos, f))
+
+        keywords = set(kw.lower() for kw in f['keywords'])
+        word = (f.get('match_mode') or ALERT_KEYWORD_MATCH) == 'word'
+        if not keywords or '' in keywords:
+            self.keyword_free.add(filter_id)
+        else:
+            for kw in keywords:
+                pattern_id = self.automaton.add(kw)
+                self.keyword_filters.setdefault((pattern_id, word), []).append(filter_id)
+                if word and pattern_id not in self.pattern_tokens:
+                    self.pattern_tokens[pattern_id] = tuple(tokenize(kw))
+
+        categories = set(cat.lower() for cat in f['categories'])
+        for cat in categories or (_ANY,):
+            self.category_buckets.setdefault(cat, set()).add(filter_id)
+
+        for job_type in f.get('job_types') or (_ANY,):
+            self.type_buckets.setdefault(job_type, set()).add(filter_id)
+
+        for location in f.get('client_locations') or (_ANY,):
+            self.location_buckets.setdefault(location, set()).add(filter_id)
+
+        for location in f.get('exclude_locations') or ():
+            self.exclude_buckets.setdefault(location, set()).add(filter_id)
+
+        for skill in skill_keys(f.get('skills') or ()) or (_ANY,):
+            self.skill_buckets.setdefault(skill, set()).add(filter_id)
+
+        if f.get('min_price') is not None or f.get('max_price') is not None or f.get('min_client_rating') is not None:
+            self.bounded.add(filter_id)
+
+    def _keyword_hits(self, job):
+        """Keys of keyword_filters whose keyword the job contains."""
+        tokens = None
+        search_text = job_search_text(job)
+        for pattern_id in self.automaton.scan(search_text):
+            if (pattern_id, False) in self.keyword_filters:
+                yield pattern_id, False
+            if (pattern_id, True) in self.keyword_filters:
+                if tokens is None:
+                    tokens = job_tokens(job)
+                if phrase_matches(self.pattern_tokens[pattern_id], tokens, search_text):
+                    yield pattern_id, True
+
+    def _bucket(self, buckets, value):
+        return buckets.get(value, set()) | buckets.get(_ANY, set())
+
+    def match_filters(self, job):
+        """Return the ids of every compiled filter the job satisfies."""
+        candidates = self._bucket(self.category_buckets, (job.get('category') or '').lower())
+        if not candidates:
+            return set()
+        candidates &= self._bucket(self.type_buckets, job.get('type'))
+        if not candidates:
+            return set()
+        candidates &= self._bucket(self.location_buckets, job.get('location'))
+        candidates -= self.exclude_buckets.get(job.get('location'), set())
+        if not candidates:
+            return set()
+        if _ANY not in self.skill_buckets or len(self.skill_buckets) > 1:
+            skill_hits = set(self.skill_buckets.get(_ANY, ()))
+            for skill in job_skill_keys(job):
+                skill_hits.update(self.skill_buckets.get(skill, ()))
+            candidates &= skill_hits
+            if not candidates:
+                return set()
+
+        keyword_hits = set(self.keyword_free)
+        if not candidates <= keyword_hits:
+            for key in self._keyword_hits(job):
+                keyword_hits.update(self.keyword_filters[key])
+        candidates &= keyword_hits
+
+        for filter_id in candidates & self.bounded:
+            if not self._within_bounds(job, self.filters[filter_id][1]):
+                candidates.discard(filter_id)
+        return candidates
+
+    def _within_bounds(self, job, f):
+        min_price = f.get('min_price')
+        max_price = f.get('max_price')
+        min_client_rating = f.get('min_client_rating')
+        budget = job.get('budget') or 0
+        if min_price is not None and budget < min_price:
+            return False
+        if max_price is not None and budget > max_price:
+            return False
+        if min_client_rating is not None and (job.get('client_rating') is None or job['client_rating'] < min_client_rating):
+            return False
+        return True
+
+    def match_filters_batch(self, jobs):
+        """
+        Like match_filters for a whole cycle of jobs: the category, type, location, price and
+        rating predicates are evaluated as array masks over every job at once, and only the
+        surviving (job, filter) candidates go through the keyword check. Returns one array of
+        filter ids per job.
+        """
+        if self._columns is None:
+            self._columns = FilterColumns([f for _, f in self.filters])
+            self._keyword_free = np.zeros(len(self.filters), dtype=bool)
+            self._keyword_free[list(self.keyword_free)] = True
+            self._pattern_filters = {
+                key: np.array(filter_ids, dtype=np.intp) for key, filter_ids in self.keyword_filters.items()
+            }
+        columns = self._columns
+        block = max(1, BATCH_MATCH_CELLS // max(1, len(self.filters)))
+        results = []
+        for start in range(0, len(jobs), block):
+            chunk = jobs[start:start + block]
+            mask = columns.mask(columns.encode(chunk))
+            for job, survivors in zip(chunk, mask):
+                filter_ids = np.flatnonzero(survivors)
+                if filter_ids.size and not self._keyword_free[filter_ids].all():
+                    found = [self._pattern_filters[key] for key in self._keyword_hits(job)]
+                    keyword_ok = self._keyword_free[filter_ids]
+                    if found:
+                        keyword_ok |= np.isin(filter_ids, np.concatenate(found))
+                    filter_ids = filter_ids[keyword_ok]
+                results.append(filter_ids)
+        return results
+
+    def match_users_batch(self, jobs):
+        """Yield (job, users with at least one matching filter, in registration order) for every job."""
+        for job, filter_ids in zip(jobs, self.match_filters_batch(jobs)):
+            positions = set(self.filters[filter_id][0] for filter_id in filter_ids.tolist())
+            yield job, [self.users[pos] for pos in sorted(positions)]
+
+    def match(self, job):
+        """Return the set of (user_id, filter_id) pairs the job matches."""
+        pairs = set()
+        for filter_id in self.match_filters(job):
+            user_pos, f = self.filters[filter_id]
+            pairs.add((self.users[user_pos]['user_id'], f.get('id')))
+        return pairs
+
+    def match_users(self, job):
+        """Return the users with at least one matching filter, in registration order."""
+        positions = set(self.filters[filter_id][0] for filter_id in self.match_filters(job))
+        return [self.users[pos] for pos in sorted(positions)]
@@ -0,0 +1,68 @@
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+
+# Buckets from 1ms to ~1 min, covering both DB statements and whole scheduler cycles
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 60)
+
+CRAWL_DURATION = Histogram(
+    "freelancelot_crawl_duration_seconds", "Apify fetch plus save_jobs, per crawl", ["mode"], buckets=_BUCKETS
+)
+CRAWL_ITEMS = Counter(
+    "freelancelot_crawl_items_total", "Crawled items by outcome (fetched, skipped as seen, new)", ["outcome"]
+)
+MATCH_DURATION = Histogram(
+    "freelancelot_match_duration_seconds", "Filter matching time per alert cycle", buckets=_BUCKETS
+)
+MATCHES = Counter("freelancelot_matches_total", "User/job matches found")
+ALERTS = Counter("freelancelot_alerts_total", "Alerts by outcome (queued, claimed, delivered, retried, failed, released)", ["outcome"])
+TELEGRAM_SEND_DURATION = Histogram(
+    "freelancelot_telegram_send_seconds", "Telegram Bot API call latency, per attempt", ["method"], buckets=_BUCKETS
+)
+TELEGRAM_RESPONSES = Counter(
+    "freelancelot_telegram_responses_total", "Telegram Bot API responses by status code", ["method", "status"]
+)
+DB_STATEMENT_DURATION = Histogram(
+    "freelancelot_db_statement_seconds", "SQL statement execution time", ["engine", "operation"], buckets=_BUCKETS
+)
+TELEGRAM_LINKS = Counter(
+    "freelancelot_telegram_links_total", "Telegram account links by outcome (linked, not_found, failed)", ["outcome"]
+)
+SUPABASE_CALLS = Counter("freelancelot_supabase_calls_total", "Supabase (PostgREST) requests", ["table", "operation"])
+SCHEDULER_JOB_DURATION = Histogram(
+    "freelancelot_scheduler_job_seconds", "Scheduler job run time", ["job"], buckets=_BUCKETS
+)
+SCHEDULER_EVENTS = Counter(
+    "freelancelot_scheduler_events_total",
+    "Scheduler runs that overran their interval, were skipped (max instances / missed) or failed",
+    ["job", "event"],
+)
+STARTUP_SECONDS = Gauge(
+    "freelancelot_startup_seconds", "Time spent in each startup phase (imports, service init, warm-up, schema)", ["phase"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "freelancelot_http_request_seconds", "API request latency", ["method", "route", "status"], buckets=_BUCKETS
+)
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement run through a (sync) SQLAlchemy engine, labelled by SQL verb."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_STATEMENT_DURATION.labels(name, operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None and context.connection.info.get("metrics_started"):
+            context.connection.info["metrics_started"].pop()
+
+
+def metrics_response():
+    return generate_latest(), CONTENT_TYPE_LATEST
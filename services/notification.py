@@ -1,16 +1,27 @@
 import os
-import requests
+import time
+import html
 import logging
 import json
-from utils.logger import setup_logging
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
+from services.telegram_delivery import get_delivery_engine
+from services.enrichment import (
+    ALERT_KEYWORD_MATCH, job_search_text, job_tokens, job_skill_keys, skill_keys, keyword_matches,
+)
 
 logger = logging.getLogger(__name__)
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+# How long a digest user's matches are held before sending; 0 sends one digest per cycle
+DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", "0"))
+
 
 def match_jobs_to_filter(jobs, filter):
     matched = []
     keywords = set([kw.lower() for kw in filter['keywords']])
+    keyword_mode = filter.get('match_mode') or ALERT_KEYWORD_MATCH
     categories = set([cat.lower() for cat in filter['categories']])
     min_price = filter.get('min_price')
     max_price = filter.get('max_price')
@@ -20,22 +31,24 @@ def match_jobs_to_filter(jobs, filter):
     exclude_locations = filter.get('exclude_locations', [])
     min_client_rating = filter.get('min_client_rating')
     job_types = filter.get('job_types', [])
+    skills = set(skill_keys(filter.get('skills') or ()))
 
     for job in jobs:
-        job_text = (job['title'] + ' ' + job['description']).lower()
-        
-        # Keyword filtering
-        if keywords and not any(kw in job_text for kw in keywords):
-            continue
+        # Keyword filtering, on the text and tokens computed at ingest
+        if keywords:
+            job_text, tokens = job_search_text(job), job_tokens(job)
+            if not any(keyword_matches(kw, job_text, tokens, keyword_mode) for kw in keywords):
+                continue
             
         # Category filtering
-        if categories and job.get('category', '').lower() not in categories:
+        if categories and (job.get('category') or '').lower() not in categories:
             continue
             
-        # Price filtering
-        if min_price is not None and job.get('budget', 0) < min_price:
+        # Price filtering; a job without a budget counts as 0
+        budget = job.get('budget') or 0
+        if min_price is not None and budget < min_price:
             continue
-        if max_price is not None and job.get('budget', 0) > max_price:
+        if max_price is not None and budget > max_price:
             continue
             
         # Client location filtering (include)
@@ -46,101 +59,257 @@ def match_jobs_to_filter(jobs, filter):
         if exclude_locations and job.get('location') in exclude_locations:
             continue
             
-        # Minimum client rating filtering
-        if min_client_rating is not None and job.get('client_rating', 0) < min_client_rating:
+        # Minimum client rating filtering; a job without a rating fails any minimum
+        if min_client_rating is not None and (job.get('client_rating') is None or job['client_rating'] < min_client_rating):
             continue
             
         # Job type filtering
         if job_types and job.get('type') not in job_types:
             continue
+
+        # Skill filtering: any of the filter's skills
+        if skills and skills.isdisjoint(job_skill_keys(job)):
+            continue
             
         matched.append(job)
     # logger.info(f"Matched {len(matched)} jobs for filter '{filter.get('name', '')}'")
     return matched
 
-def send_telegram_alert(telegram_chat_id, jobs):
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not bot_token:
-        logger.error("TELEGRAM_BOT_TOKEN not set in environment variables")
-        raise Exception("TELEGRAM_BOT_TOKEN not set in environment variables")
+def format_posted_time(published_at):
+    if not published_at:
+        return "unknown"
+    delta = datetime.utcnow() - published_at
+    minutes = int(delta.total_seconds() // 60)
+    if minutes < 1:
+        return "just now"
+    elif minutes == 1:
+        return "1 minute ago"
+    elif minutes < 60:
+        return f"{minutes} minutes ago"
+    hours = minutes // 60
+    return f"{hours} hour{'s' if hours > 1 else ''} ago"
+
+
+# Stands in for the "Posted N ago" text while a message is rendered once per job
+POSTED_SLOT = "\x00posted\x00"
+
+
+def render_message(job, posted_str):
+    title = job.get('title', 'No Title')
+    price = f"${job['budget']:.2f}" if job.get('budget') else "N/A"
+    job_type = job.get('type', 'N/A')
+    category = job.get('category', 'N/A')
+    location = job.get('location', 'N/A')
+    client_spend = f"${job['client_spend']:.0f}" if job.get('client_spend') else "N/A"
+    client_rating = f"{job['client_rating']:.1f}★" if job.get('client_rating') else "N/A"
+    published_at = job.get('published_at')
+    published_str = published_at.strftime('%b %d, %Y') if published_at else "N/A"
+    # Cleaned once at ingest (services/enrichment.py)
+    skills = job.get('skills')
+    if skills:
+        skills_str = ' • '.join(skills)
+    else:
+        skills_str = "N/A"
+    desc = job.get('description', '')
+    desc_short = desc[:200] + ("..." if len(desc) > 200 else "")
+
+    return (
+        f"<b>{title}</b>\n\n"
+        f"{category} • {job_type} • <b>Budget: {price}</b>\n"
+        f"<b>Skills</b>\n{skills_str}\n\n"
+        f"<b>About Client</b>\n🌍 {location} • 💸 Total spent: {client_spend} • ⭐ Rating: {client_rating} • 📅 Since: {published_str}\n"
+        f"🕒 Posted {posted_str}\n\n"
+        f"<b>Description</b>\n<blockquote>{desc_short}</blockquote>\n\n"
+    )
+
+
+@dataclass
+class RenderedJob:
+    """A job's alert message with everything but the relative posted time filled in."""
+    published_at: Optional[datetime]
+    message_parts: tuple
+    digest_parts: tuple
+    reply_markup: str
+
+    def message(self) -> str:
+        return format_posted_time(self.published_at).join(self.message_parts)
+
+    def digest_entry(self) -> str:
+        return format_posted_time(self.published_at).join(self.digest_parts)
+
+
+def render_job(job) -> RenderedJob:
+    reply_markup = {
+        "inline_keyboard": [
+            [
+                {"text": "Apply Now", "url": job.get('url', '#')}
+            ]
+        ]
+    }
+    return RenderedJob(
+        published_at=job.get('published_at'),
+        message_parts=tuple(render_message(job, POSTED_SLOT).split(POSTED_SLOT)),
+        digest_parts=tuple(format_digest_entry(job, POSTED_SLOT).split(POSTED_SLOT)),
+        reply_markup=json.dumps(reply_markup),
+    )
+
+
+# Job fields an alert is rendered from; this is what the alert outbox stores per row
+ALERT_PAYLOAD_FIELDS = (
+    'id', 'title', 'url', 'type', 'category', 'budget', 'location', 'client_spend', 'client_rating', 'skills',
+)
+
+
+def alert_payload(job) -> str:
+    payload = {field: job.get(field) for field in ALERT_PAYLOAD_FIELDS}
+    # Messages show at most 200 characters; one more keeps the "..." marker correct
+    payload['description'] = (job.get('description') or '')[:201]
+    published_at = job.get('published_at')
+    payload['published_at'] = published_at.isoformat() if published_at else None
+    return json.dumps(payload)
+
+
+def job_from_payload(payload) -> dict:
+    job = dict(json.loads(payload) if isinstance(payload, str) else payload)
+    if job.get('published_at'):
+        job['published_at'] = datetime.fromisoformat(job['published_at'])
+    return job
+
+
+class RenderedJobCache:
+    """
+    Rendered messages by job ID, so a job matched by many users is formatted once.
+    Jobs are immutable once stored; entries are evicted when they leave the alert window.
+    """
+
+    def __init__(self):
+        self.entries = {}  # job_id -> RenderedJob
+
+    def get(self, job) -> RenderedJob:
+        rendered = self.entries.get(job.get('id'))
+        if rendered is None:
+            rendered = render_job(job)
+            self.entries[job.get('id')] = rendered
+        return rendered
+
+    def evict_before(self, cutoff: datetime):
+        self.entries = {
+            job_id: rendered for job_id, rendered in self.entries.items()
+            if rendered.published_at is not None and rendered.published_at >= cutoff
+        }
+
+
+rendered_jobs = RenderedJobCache()
+
+
+def build_telegram_payload(telegram_chat_id, job):
+    rendered = rendered_jobs.get(job)
+    return {
+        "chat_id": telegram_chat_id,
+        "text": rendered.message(),
+        "parse_mode": "HTML",
+        "disable_web_page_preview": True,
+        "reply_markup": rendered.reply_markup
+    }
+
+
+async def send_telegram_alert(telegram_chat_id, jobs):
+    engine = get_delivery_engine()
     if not jobs:
         logger.info(f"No jobs to send to telegram_id {telegram_chat_id}")
-        return
+        return []
     # Sort jobs by published_at ascending (oldest first)
     jobs = sorted(jobs, key=lambda job: job.get('published_at') or datetime.min)
-    for job in jobs:
-        id = job.get('id', 'N/A')
-        title = job.get('title', 'No Title')
-        url = job.get('url', '#')
-        price = f"${job['budget']:.2f}" if job.get('budget') else "N/A"
-        job_type = job.get('type', 'N/A')
-        category = job.get('category', 'N/A')
-        location = job.get('location', 'N/A')
-        client_spend = f"${job['client_spend']:.0f}" if job.get('client_spend') else "N/A"
-        client_rating = f"{job['client_rating']:.1f}★" if job.get('client_rating') else "N/A"
-        published_at = job.get('published_at')
-        published_str = published_at.strftime('%b %d, %Y') if published_at else "N/A"
-        skills = job.get('skills', '')
-        if isinstance(skills, list):
-            skills_str = ' • '.join([s.strip() for s in skills if s.strip()])
-        elif isinstance(skills, str):
-            skills_str = ' • '.join([s.strip() for s in skills.split(',') if s.strip()])
-        else:
-            skills_str = "N/A"
-        desc = job.get('description', '')
-        desc_short = desc[:200] + ("..." if len(desc) > 200 else "")
-
-        # Calculate posted time
-        now = datetime.utcnow()
-        if published_at:
-            delta = now - published_at
-            minutes = int(delta.total_seconds() // 60)
-            if minutes < 1:
-                posted_str = "just now"
-            elif minutes == 1:
-                posted_str = "1 minute ago"
-            elif minutes < 60:
-                posted_str = f"{minutes} minutes ago"
-            else:
-                hours = minutes // 60
-                posted_str = f"{hours} hour{'s' if hours > 1 else ''} ago"
+    results = await engine.send_many(
+        ("sendMessage", build_telegram_payload(telegram_chat_id, job), job.get('id', 'N/A'))
+        for job in jobs
+    )
+    for result in results:
+        if result.ok:
+            logger.info(f"Sent jobId '{result.ref}' to telegram_id {telegram_chat_id}")
         else:
-            posted_str = "unknown"
-
-        message = (
-            f"<b>{title}</b>\n\n"
-            f"{category} • {job_type} • <b>Budget: {price}</b>\n"
-            f"<b>Skills</b>\n{skills_str}\n\n"
-            f"<b>About Client</b>\n🌍 {location} • 💸 Total spent: {client_spend} • ⭐ Rating: {client_rating} • 📅 Since: {published_str}\n"
-            f"🕒 Posted {posted_str}\n\n"
-            f"<b>Description</b>\n<blockquote>{desc_short}</blockquote>\n\n"
-        )
-
-        reply_markup = {
-            "inline_keyboard": [
-                [
-                    {"text": "Apply Now", "url": url}
-                ]
-            ]
-        }
+            logger.error(
+                f"Failed to send jobId '{result.ref}' to telegram_id {telegram_chat_id} "
+                f"after {result.attempts} attempt(s): status={result.status_code} error={result.error}"
+            )
+    return results
+
+
+def format_digest_entry(job, posted_str):
+    title = html.escape((job.get('title') or 'No Title')[:200])
+    url = html.escape(job.get('url') or '#', quote=True)
+    price = f"${job['budget']:.2f}" if job.get('budget') else "N/A"
+    client_rating = f"{job['client_rating']:.1f}★" if job.get('client_rating') else "N/A"
+    return (
+        f"<b><a href=\"{url}\">{title}</a></b>\n"
+        f"{html.escape(job.get('category') or 'N/A')} • {html.escape(job.get('type') or 'N/A')} • Budget: {price}\n"
+        f"🌍 {html.escape(job.get('location') or 'N/A')} • ⭐ {client_rating} • 🕒 {posted_str}\n"
+    )
+
 
-        url_api = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {
+def build_digest_messages(jobs):
+    """
+    Pack jobs into as few HTML messages as fit Telegram's length limit.
+    Returns (text, job_ids) per message.
+    """
+    messages = []
+    text = f"🔔 <b>{len(jobs)} new job{'s' if len(jobs) != 1 else ''}</b> matching your filters\n\n"
+    job_ids = []
+    for job in jobs:
+        entry = rendered_jobs.get(job).digest_entry() + "\n"
+        if job_ids and len(text) + len(entry) > TELEGRAM_MESSAGE_LIMIT:
+            messages.append((text.rstrip(), tuple(job_ids)))
+            text, job_ids = "", []
+        text += entry
+        job_ids.append(job.get('id', 'N/A'))
+    if job_ids:
+        messages.append((text.rstrip(), tuple(job_ids)))
+    return messages
+
+
+async def send_telegram_digest(telegram_chat_id, jobs):
+    """Send a user's matches grouped into digest messages; each result's ref is the tuple of job IDs it carried."""
+    engine = get_delivery_engine()
+    if not jobs:
+        return []
+    jobs = sorted(jobs, key=lambda job: job.get('published_at') or datetime.min)
+    results = await engine.send_many(
+        ("sendMessage", {
             "chat_id": telegram_chat_id,
-            "text": message,
+            "text": text,
             "parse_mode": "HTML",
             "disable_web_page_preview": True,
-            "reply_markup": json.dumps(reply_markup)
-        }
-        try:
-            response = requests.post(url_api, data=payload)
-            if response.status_code == 200:
-                logger.info(f"Sent jobId '{id}' to telegram_id {telegram_chat_id}")
-            else:
-                # logger.error(f"Failed to send alert to telegram_id {telegram_chat_id}: {response.text}")
-                # TODO add error back
-                pass
-        except Exception as e:
-            # TODO error back
-            # logger.error(f"Exception sending alert to telegram_id {telegram_chat_id}: {e}") 
-            pass
\ No newline at end of file
+        }, job_ids)
+        for text, job_ids in build_digest_messages(jobs)
+    )
+    for result in results:
+        if result.ok:
+            logger.info(f"Sent digest of {len(result.ref)} jobs to telegram_id {telegram_chat_id}")
+        else:
+            logger.error(
+                f"Failed to send digest of {len(result.ref)} jobs to telegram_id {telegram_chat_id} "
+                f"after {result.attempts} attempt(s): status={result.status_code} error={result.error}"
+            )
+    return results
+
+
+class DigestBuffer:
+    """Matches of digest-mode users, held until the user's window has elapsed."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.pending = {}  # user_id -> (first added, latest user record, {job_id: job})
+
+    def add(self, user_id, user, job):
+        since, _, jobs = self.pending.get(user_id, (time.monotonic(), None, {}))
+        jobs[job['id']] = job
+        self.pending[user_id] = (since, user, jobs)
+
+    def pop_due(self):
+        """Remove and return (user_id, user, jobs) for every user whose window has elapsed."""
+        now = time.monotonic()
+        due = [user_id for user_id, (since, _, _) in self.pending.items() if now - since >= self.window_seconds]
+        return [(user_id, *self.pending.pop(user_id)[1:]) for user_id in due]
+
+    def __len__(self):
+        return len(self.pending)
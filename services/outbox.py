@@ -0,0 +1,124 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from services.postgres_async import enqueue_alerts, claim_outbox, complete_outbox
+from services.notification import (
+    send_telegram_alert, send_telegram_digest, alert_payload, job_from_payload, DIGEST_WINDOW_SECONDS,
+)
+from services.metrics import ALERTS
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Idle workers re-check for due rows this often (new rows queued in-process wake them at once)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+# A claimed batch is reserved this long; if its worker dies the rows become due again afterwards
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "600"))
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+async def enqueue_matches(matches):
+    """Queue matched (user_id, job_id) -> (user, job) pairs for the delivery workers."""
+    payloads = {}  # job_id -> payload, serialized once per job
+    rows = []
+    for (user_id, job_id), (user, job) in matches.items():
+        if job_id not in payloads:
+            payloads[job_id] = alert_payload(job)
+        mode = 'digest' if user.get('delivery_mode') == 'digest' else 'instant'
+        rows.append((user_id, job_id, user['telegram_id'], mode, payloads[job_id]))
+    queued = await enqueue_alerts(rows, DIGEST_WINDOW_SECONDS)
+    ALERTS.labels("queued").inc(queued)
+    if queued:
+        workers.wake()
+        logging.info(f"[Outbox] Queued {queued} of {len(rows)} matched alerts")
+    return queued
+
+
+async def deliver_batch(rows):
+    """Send one claimed batch and record the outcome of every row; returns the number delivered."""
+    groups = {}  # (user_id, chat_id, mode) -> rows
+    for row in rows:
+        groups.setdefault((row.user_id, row.chat_id, row.mode), []).append(row)
+    sends = []  # (rows by job_id, coroutine)
+    for (_, chat_id, mode), group in groups.items():
+        jobs = [job_from_payload(row.payload) for row in group]
+        send = send_telegram_digest(chat_id, jobs) if mode == 'digest' else send_telegram_alert(chat_id, jobs)
+        sends.append(({row.job_id: row for row in group}, send))
+
+    # Deliver concurrently; the delivery engine enforces Telegram's rate limits
+    results = await asyncio.gather(*(send for _, send in sends))
+    delivered, retries, failures = [], [], []
+    now = datetime.utcnow()
+    for (by_job, _), group_results in zip(sends, results):
+        for result in group_results:
+            job_ids = result.ref if isinstance(result.ref, tuple) else (result.ref,)
+            for row in (by_job[job_id] for job_id in job_ids):
+                if result.ok:
+                    delivered.append(row.id)
+                elif result.retryable and row.attempts < OUTBOX_MAX_ATTEMPTS:
+                    error = f"{result.status_code}: {result.error}"
+                    retries.append((row.id, now + timedelta(seconds=backoff_seconds(row.attempts)), error))
+                else:
+                    # Blocked bot, unknown chat or out of attempts: kept as failed so it is not re-queued
+                    failures.append((row.id, f"{result.status_code}: {result.error}"))
+    await complete_outbox(delivered, retries, failures)
+    ALERTS.labels("delivered").inc(len(delivered))
+    ALERTS.labels("retried").inc(len(retries))
+    ALERTS.labels("failed").inc(len(failures))
+    logging.info(
+        f"[Outbox] Delivered {len(delivered)}/{len(rows)} alerts, {len(retries)} to retry, {len(failures)} failed"
+    )
+    return len(delivered)
+
+
+class OutboxWorkers:
+    """Async workers draining the alert outbox; each claims its own batch with FOR UPDATE SKIP LOCKED."""
+
+    def __init__(self, count: int, batch_size: int, poll_seconds: float):
+        self.count = count
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.tasks = []
+        self._wake = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._run(n)) for n in range(self.count)]
+        logging.info(f"[Outbox] Started {self.count} delivery workers")
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _run(self, n):
+        while True:
+            try:
+                rows = await claim_outbox(self.batch_size, OUTBOX_LEASE_SECONDS)
+                if rows:
+                    await deliver_batch(rows)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The batch stays leased and is retried by any worker once the lease runs out
+                logging.error(f"[Outbox] Worker {n} failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+workers = OutboxWorkers(OUTBOX_WORKERS, OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS)
@@ -0,0 +1,102 @@
+import os
+import re
+import logging
+from datetime import datetime, timedelta, date
+from sqlalchemy import text
+
+JOBS_RETENTION_DAYS = int(os.getenv("JOBS_RETENTION_DAYS", "30"))
+ALERTS_RETENTION_DAYS = int(os.getenv("ALERTS_RETENTION_DAYS", "30"))
+# "drop" deletes expired partitions; "detach" keeps them as standalone tables for archiving
+PARTITION_RETENTION_ACTION = os.getenv("PARTITION_RETENTION_ACTION", "drop")
+PARTITION_DAYS_AHEAD = int(os.getenv("PARTITION_DAYS_AHEAD", "7"))
+
+_PARTITION_NAME = re.compile(r"_p(\d{8})$")
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+    return kind == "p"
+
+
+def ensure_daily_partitions(conn, table: str, start: date, end: date):
+    """Create one partition per day in [start, end] plus a default partition for strays."""
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    day = start
+    while day <= end:
+        name = partition_name(table, day)
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if not exists:
+            # Runs in a savepoint: rows for this day already sitting in the default
+            # partition make the create fail, and that must not abort the other days
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {table} "
+                        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                    ))
+            except Exception as e:
+                logging.warning(f"[DB] Could not create partition {name}: {str(e).splitlines()[0]}")
+        day += timedelta(days=1)
+
+
+def expire_daily_partitions(conn, table: str, column: str, retention_days: int) -> list[str]:
+    """Drop or detach day partitions older than the retention window; returns their names."""
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    children = conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = to_regclass(:table)"),
+        {"table": table},
+    ).scalars().all()
+    expired = []
+    for name in children:
+        match = _PARTITION_NAME.search(name)
+        if not match or datetime.strptime(match.group(1), "%Y%m%d").date() >= cutoff:
+            continue
+        if PARTITION_RETENTION_ACTION == "detach":
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        expired.append(name)
+    if PARTITION_RETENTION_ACTION != "detach":
+        conn.execute(text(f"DELETE FROM {table}_default WHERE {column} < :cutoff"), {"cutoff": cutoff})
+    return expired
+
+
+def migrate_to_partitioned(conn, table, column: str, keep_days: int):
+    """
+    Swap a plain table for the partitioned definition in `table` (a SQLAlchemy Table).
+    Rows from the last `keep_days` are copied over; the old table is kept, renamed to
+    <name>_unpartitioned, so nothing is lost. Runs inside the caller's transaction.
+    """
+    name = table.name
+    archive = f"{name}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+    # Free the index and constraint names the partitioned table is about to use
+    for index in conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :archive"), {"archive": archive}
+    ).scalars().all():
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+
+    table.create(conn)
+    since = datetime.utcnow().date() - timedelta(days=keep_days)
+    ensure_daily_partitions(conn, name, since, datetime.utcnow().date() + timedelta(days=PARTITION_DAYS_AHEAD))
+
+    columns = ", ".join(c.name for c in table.columns if c.computed is None)
+    copied = conn.execute(
+        text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {archive} "
+             f"WHERE {column} >= :since ON CONFLICT DO NOTHING"),
+        {"since": since},
+    ).rowcount
+    for c in table.columns:
+        if c.identity is not None:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{name}', '{c.name}'), "
+                f"GREATEST((SELECT MAX({c.name}) FROM {archive}), 1))"
+            ))
+    logging.info(f"[DB] Partitioned {name} by {column}: copied {copied} recent rows, old table kept as {archive}")
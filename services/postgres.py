@@ -1,129 +1,645 @@
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from model.job import Job
+from sqlalchemy import create_engine, text, func, select, String
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from model.job import Job, SEARCH_VECTOR_SQL
 from model.filter import Filter, FilterKeyword, FilterCategory, Profile
 import os
-from dotenv import load_dotenv
 from sqlalchemy import and_
-from model.job_alert import JobAlert
-
-load_dotenv()
+from services.container import container
+from model.job_alert import JobAlert, JobAlertCount
+from model.pipeline_cursor import PipelineCursor
+from model.scheduler_instance import SchedulerInstance
+from model.alert_outbox import AlertOutbox
+from uuid import UUID
+from services.query_cache import bump_data_generation
+from services.enrichment import enrich_job
+from services.metrics import instrument_engine
+from services.partitions import (
+    JOBS_RETENTION_DAYS, ALERTS_RETENTION_DAYS, PARTITION_DAYS_AHEAD,
+    is_partitioned, migrate_to_partitioned, ensure_daily_partitions, expire_daily_partitions,
+)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+# Shared by the sync engine here and the async engine in services/postgres_async.py
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
 
-def save_jobs(jobs: list[dict]):
-    session = SessionLocal()
-    try:
-        for job in jobs:
-            # logging.info(f"[DB] Saving job: {job.get('title', 'No title')}")
-
-            if not job.get("url") or not job.get("title"):
-                logging.warning("[DB] Skipping job with missing URL or title")
-                continue
-
-            # Upwork jobs have stable IDs → use to deduplicate
-            exists = session.query(Job).filter_by(id=job["url"].split("~")[-1]).first()
-            if exists:
-                continue  # skip if already saved
-
-            new_job = Job(
-                id=job["url"].split("~")[-1],
-                title=job["title"],
-                url=job["url"],
-                type=job["type"],
-                category=job["category"],
-                description=job["description"],
-                skills=",".join(job["skills"]),
-                budget=float(job["budget"] or 0),
-                location=job["location"],
-                client_spend=job["client_spend"],
-                client_rating=job["client_rating"],
-                published_at=datetime.fromisoformat(job["published_at"])
-            )
-            session.add(new_job)
+def _create_engine():
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+    instrument_engine(engine, "sync")
+    return engine
+
+def _warm_engine(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+container.register("postgres", _create_engine, warm=_warm_engine, close=lambda engine: engine.dispose())
+
+def get_engine():
+    return container.get("postgres")
+
+def get_session() -> Session:
+    return Session(bind=get_engine())
+
+# Rows per multi-row INSERT, kept well under Postgres' 65535 bind parameter limit
+JOB_BATCH_SIZE = 2000
+# How far back a (user, job) pair is checked before alerting again; jobs are only
+# alerted on within minutes of publication, so this just needs to cover that
+ALERT_DEDUP_WINDOW_HOURS = int(os.getenv("ALERT_DEDUP_WINDOW_HOURS", "48"))
+# Hourly rollup rows older than this are deleted by maintenance
+ALERT_COUNTS_RETENTION_HOURS = 48
+# Serializes alert claims across processes (pg_advisory_xact_lock key)
+ALERT_CLAIM_LOCK = 7_210_001
+# Serializes job inserts so ingest_seq values become visible in order (pg_advisory_xact_lock key)
+JOB_INSERT_LOCK = 7_210_003
+# Takes one of the keys above until the transaction ends
+ADVISORY_XACT_LOCK_SQL = text("SELECT pg_advisory_xact_lock(:key)")
+
+def job_row(job: dict) -> dict:
+    if "tokens" not in job:
+        job = enrich_job(job)
+    return {
+        # Upwork jobs have stable IDs → use to deduplicate
+        "id": job["url"].split("~")[-1],
+        "title": job["title"],
+        "url": job["url"],
+        "type": job["type"],
+        "category": job["category"],
+        "description": job["description"],
+        "skills": job["skills"],
+        "budget": float(job["budget"] or 0),
+        "location": job["location"],
+        "client_spend": job["client_spend"],
+        "client_rating": job["client_rating"],
+        "published_at": datetime.fromisoformat(job["published_at"]),
+        "search_text": job["search_text"],
+        "tokens": job["tokens"],
+        "skill_keys": job["skill_keys"],
+    }
+
+def job_rows(jobs: list[dict]) -> list[dict]:
+    rows = {}
+    for job in jobs:
+        if not job.get("url") or not job.get("title"):
+            logging.warning("[DB] Skipping job with missing URL or title")
+            continue
+        row = job_row(job)
+        rows.setdefault(row["id"], row)
+    return list(rows.values())
+
+def existing_job_ids_statement(ids):
+    # By id alone, across every partition: the key also holds published_at, so a re-crawl
+    # reporting a different publish time would not conflict and would store a second row
+    return select(Job.id).where(Job.id.in_(ids))
 
-        logging.info(f"[DB] Saving {len(jobs)} jobs")
+def new_job_rows(session, rows):
+    """`rows` without the jobs already stored."""
+    existing = set()
+    for start in range(0, len(rows), JOB_BATCH_SIZE):
+        batch = [row["id"] for row in rows[start:start + JOB_BATCH_SIZE]]
+        existing.update(session.execute(existing_job_ids_statement(batch)).scalars())
+    return [row for row in rows if row["id"] not in existing]
+
+def insert_jobs_statement(rows: list[dict]):
+    return (
+        pg_insert(Job)
+        .values(rows)
+        # Rows are checked by id first (new_job_rows); this only covers exact duplicates
+        .on_conflict_do_nothing(index_elements=["id", "published_at"])
+        .returning(Job.id, Job.ingest_seq)
+    )
+
+def save_jobs(jobs: list[dict]) -> list[str]:
+    """
+    Insert scraped jobs in bulk, skipping ones already stored, and return the IDs
+    that were actually new in this batch. Stored jobs are recognised by id in any
+    partition, under JOB_INSERT_LOCK so concurrent writers cannot both insert one; the
+    stream crawler's seen-ID set skips most of them earlier, but only within one process.
+    """
+    session = get_session()
+    try:
+        session.execute(ADVISORY_XACT_LOCK_SQL, {"key": JOB_INSERT_LOCK})
+        rows = new_job_rows(session, job_rows(jobs))
+        new_ids = []
+        for start in range(0, len(rows), JOB_BATCH_SIZE):
+            result = session.execute(insert_jobs_statement(rows[start:start + JOB_BATCH_SIZE]))
+            new_ids.extend(row[0] for row in result)
         session.commit()
+        if new_ids:
+            bump_data_generation()
+        logging.info(f"[DB] Saved {len(new_ids)} new of {len(jobs)} jobs")
+        return new_ids
     except Exception as e:
         logging.error(f"[DB] Error saving jobs: {e}")
         session.rollback()
+        return []
     finally:
         session.close()
 
+# Idempotent upgrades for tables that already exist (create_all never alters them)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS ingest_seq BIGINT GENERATED BY DEFAULT AS IDENTITY",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_ingest_seq ON jobs (ingest_seq)",
+    f"ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_search_vector ON jobs USING gin (search_vector)",
+    # Skills were stored comma-separated before enrichment
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'jobs' AND column_name = 'skills') <> 'ARRAY' THEN
+            ALTER TABLE jobs ALTER COLUMN skills TYPE varchar[] USING string_to_array(skills, ',');
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_text varchar",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS tokens varchar[]",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS skill_keys varchar[]",
+    """
+    UPDATE jobs SET skill_keys = ARRAY(SELECT DISTINCT lower(btrim(s)) FROM unnest(skills) s WHERE btrim(s) <> '' ORDER BY 1)
+    WHERE skill_keys IS NULL AND skills IS NOT NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_jobs_skill_keys ON jobs USING gin (skill_keys)",
+    # search_text briefly joined title and description with a newline; rows still in the hot window get the space back
+    """
+    UPDATE jobs SET search_text = lower(coalesce(title, '')) || ' ' || lower(coalesce(description, ''))
+    WHERE published_at >= (now() AT TIME ZONE 'utc') - interval '1 day'
+      AND search_text = lower(coalesce(title, '')) || E'\\n' || lower(coalesce(description, ''))
+    """,
+]
+
+# Rebuilds the hourly rollup from raw rows after job_alerts is converted
+SEED_ALERT_COUNTS_SQL = text("""
+    INSERT INTO job_alert_counts (user_id, hour, count)
+    SELECT user_id, date_trunc('hour', sent_at), count(*) FROM job_alerts
+    WHERE sent_at >= :since GROUP BY 1, 2
+    ON CONFLICT (user_id, hour) DO UPDATE SET count = EXCLUDED.count
+""")
+
+def ensure_partitions(conn):
+    today = datetime.utcnow().date()
+    ahead = today + timedelta(days=PARTITION_DAYS_AHEAD)
+    ensure_daily_partitions(conn, Job.__tablename__, today - timedelta(days=JOBS_RETENTION_DAYS), ahead)
+    ensure_daily_partitions(conn, JobAlert.__tablename__, today - timedelta(days=ALERTS_RETENTION_DAYS), ahead)
+
+# Upgrades that depend on optional extensions; failures are logged and skipped
+OPTIONAL_SCHEMA_UPGRADES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Serve ILIKE '%kw%' keyword search from trigram indexes instead of sequential scans
+    "CREATE INDEX IF NOT EXISTS ix_jobs_title_trgm ON jobs USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_description_trgm ON jobs USING gin (description gin_trgm_ops)",
+]
+
+# "check": run setup_database only when the recorded schema version is behind SCHEMA_VERSION
+# "always": run it on every start (previous behaviour); "never": leave the schema alone
+DB_SCHEMA_SETUP = os.getenv("DB_SCHEMA_SETUP", "check")
+# Bump whenever setup_database gains a table, column, index or migration
+SCHEMA_VERSION = 4
+
+SCHEMA_VERSION_SQL = text("SELECT max(version) FROM schema_version")
+
+def schema_version():
+    try:
+        with get_engine().connect() as conn:
+            return conn.execute(SCHEMA_VERSION_SQL).scalar()
+    except Exception:
+        return None
+
+def ensure_schema():
+    """Bring the schema up to date according to DB_SCHEMA_SETUP; returns True when setup ran."""
+    if DB_SCHEMA_SETUP == "never":
+        return False
+    if DB_SCHEMA_SETUP == "check":
+        current = schema_version()
+        if current is not None and current >= SCHEMA_VERSION:
+            logging.info(f"[DB] Schema is at version {current}, skipping setup")
+            return False
+    setup_database()
+    return True
+
 def setup_database():
     # Create tables if they don't exist
+    engine = get_engine()
     Job.metadata.create_all(engine)
     JobAlert.metadata.create_all(engine)
-    logging.info("[DB] Database setup complete")
+    PipelineCursor.metadata.create_all(engine)
+    JobAlertCount.metadata.create_all(engine)
+    SchedulerInstance.metadata.create_all(engine)
+    AlertOutbox.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+        # One-off: tables created before partitioning are swapped for the partitioned ones
+        if not is_partitioned(conn, Job.__tablename__):
+            migrate_to_partitioned(conn, Job.__table__, "published_at", JOBS_RETENTION_DAYS)
+        if not is_partitioned(conn, JobAlert.__tablename__):
+            migrate_to_partitioned(conn, JobAlert.__table__, "sent_at", ALERTS_RETENTION_DAYS)
+            conn.execute(SEED_ALERT_COUNTS_SQL, {"since": datetime.utcnow() - timedelta(hours=ALERT_COUNTS_RETENTION_HOURS)})
+        ensure_partitions(conn)
+    for statement in OPTIONAL_SCHEMA_UPGRADES:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        except Exception as e:
+            logging.warning(f"[DB] Skipping optional schema upgrade: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version integer NOT NULL)"))
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
+    logging.info(f"[DB] Database setup complete (schema version {SCHEMA_VERSION})")
+
+def maintain_partitions():
+    """Create upcoming day partitions, drop (or detach) the ones past retention and trim the alert rollup."""
+    with get_engine().begin() as conn:
+        ensure_partitions(conn)
+        expired = expire_daily_partitions(conn, Job.__tablename__, "published_at", JOBS_RETENTION_DAYS)
+        expired += expire_daily_partitions(conn, JobAlert.__tablename__, "sent_at", ALERTS_RETENTION_DAYS)
+        conn.execute(
+            JobAlertCount.__table__.delete().where(
+                JobAlertCount.hour < datetime.utcnow() - timedelta(hours=ALERT_COUNTS_RETENTION_HOURS)
+            )
+        )
+        # Dead outbox rows only need to outlive the dedup window they block re-queueing for
+        conn.execute(
+            AlertOutbox.__table__.delete().where(
+                AlertOutbox.status == "failed",
+                AlertOutbox.created_at < datetime.utcnow() - timedelta(hours=ALERT_DEDUP_WINDOW_HOURS),
+            )
+        )
+    if expired:
+        logging.info(f"[DB] Expired {len(expired)} partitions: {', '.join(expired)}")
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "title": job.title,
+        "id": job.id,
+        "url": job.url,
+        "type": job.type,
+        "category": job.category,
+        "description": job.description,
+        "skills": job.skills or [],
+        "budget": float(job.budget) if job.budget is not None else 0,
+        "location": job.location,
+        "client_spend": job.client_spend,
+        "client_rating": job.client_rating,
+        "published_at": job.published_at,
+        "search_text": job.search_text,
+        "tokens": job.tokens,
+        "skill_keys": job.skill_keys,
+        "ingest_seq": job.ingest_seq,
+    }
+
+# Columns held by the in-memory recent-jobs window (services/recent_jobs.py)
+RECENT_JOB_COLUMNS = (
+    Job.id, Job.title, Job.url, Job.type, Job.category, Job.description, Job.skills, Job.budget,
+    Job.location, Job.client_spend, Job.client_rating, Job.published_at, Job.ingest_seq,
+    Job.search_text, Job.tokens, Job.skill_keys,
+)
+
+def recent_job_rows_statement(since):
+    return select(*RECENT_JOB_COLUMNS).where(Job.published_at >= since)
+
+def job_rows_after_seq_statement(after_seq):
+    return select(*RECENT_JOB_COLUMNS).where(Job.ingest_seq > after_seq)
+
+def latest_jobs_statement(minutes):
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    return select(Job).where(Job.published_at >= since)
 
 def get_latest_jobs(minutes=10):
-    session = SessionLocal()
+    session = get_session()
     try:
-        since = datetime.utcnow() - timedelta(minutes=minutes)
-        jobs = session.query(Job).filter(Job.published_at >= since).all()
-        return [
-            {
-                "title": job.title,
-                "id": job.id,
-                "url": job.url,
-                "type": job.type,
-                "category": job.category,
-                "description": job.description,
-                "skills": job.skills.split(",") if job.skills else [],
-                "budget": float(job.budget) if job.budget is not None else 0,
-                "location": job.location,
-                "client_spend": job.client_spend,
-                "client_rating": job.client_rating,
-                "published_at": job.published_at,
-            }
-            for job in jobs
-        ]
+        jobs = session.execute(latest_jobs_statement(minutes)).scalars().all()
+        return [job_to_dict(job) for job in jobs]
     finally:
         session.close()
 
-def log_job_alert(user_id, job_id):
-    session = SessionLocal()
+def recent_job_ids_statement(hours):
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return select(Job.id).where(Job.published_at >= since)
+
+def high_watermark_statement(after_seq):
+    return select(func.max(Job.ingest_seq)).where(Job.ingest_seq > after_seq)
+
+def jobs_after_seq_statement(after_seq, high, minutes):
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    return select(Job).where(
+        Job.ingest_seq > after_seq,
+        Job.ingest_seq <= high,
+        Job.published_at >= since,
+    ).order_by(Job.ingest_seq)
+
+def get_jobs_after_seq(after_seq, minutes=10):
+    """
+    Return (jobs, high_watermark) for jobs ingested after `after_seq` and published in
+    the last N minutes. high_watermark covers every row past the cursor, including stale
+    ones, so the caller can advance past them; it is None when nothing new was ingested.
+    Inserts hold JOB_INSERT_LOCK until they commit, so a writer's sequence values are all
+    above any committed row and gaps below the watermark are never filled later.
+    """
+    session = get_session()
+    try:
+        high = session.execute(high_watermark_statement(after_seq)).scalar()
+        if high is None:
+            return [], None
+        jobs = session.execute(jobs_after_seq_statement(after_seq, high, minutes)).scalars().all()
+        return [job_to_dict(job) for job in jobs], high
+    finally:
+        session.close()
+
+def initial_cursor_statements(minutes):
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    return (
+        select(func.min(Job.ingest_seq)).where(Job.published_at >= since),
+        select(func.coalesce(func.max(Job.ingest_seq), 0)),
+    )
+
+def get_pipeline_cursor(name, minutes=10):
+    """
+    Return the persisted position for `name`. A missing cursor starts just before the
+    oldest job still inside the alert window, so a first run neither floods old jobs
+    nor misses recent ones (already-sent alerts are skipped by job_alerts).
+    """
+    session = get_session()
     try:
-        session.execute(
-            text("INSERT INTO job_alerts (user_id, job_id, sent_at) VALUES (:user_id, :job_id, :sent_at)"),
-            {"user_id": user_id, "job_id": job_id, "sent_at": datetime.utcnow()}
+        cursor = session.get(PipelineCursor, name)
+        if cursor is not None:
+            return cursor.position
+        first_recent_statement, newest_statement = initial_cursor_statements(minutes)
+        first_recent = session.execute(first_recent_statement).scalar()
+        if first_recent is not None:
+            return first_recent - 1
+        return session.execute(newest_statement).scalar()
+    finally:
+        session.close()
+
+# Coordinated instances each persist their own alert cursor under this prefix
+SHARD_CURSOR_PREFIX = "alerts:"
+
+def shard_cursor_name(instance_id):
+    return f"{SHARD_CURSOR_PREFIX}{instance_id}"
+
+def least_shard_cursor_statement():
+    return select(func.min(PipelineCursor.position)).where(PipelineCursor.name.startswith(SHARD_CURSOR_PREFIX))
+
+def expired_shard_cursors_statement(ttl_seconds):
+    return PipelineCursor.__table__.delete().where(
+        PipelineCursor.name.startswith(SHARD_CURSOR_PREFIX),
+        PipelineCursor.updated_at < datetime.utcnow() - timedelta(seconds=ttl_seconds),
+    )
+
+def upsert_cursor_statement(name, position):
+    now = datetime.utcnow()
+    return (
+        pg_insert(PipelineCursor)
+        .values(name=name, position=position, updated_at=now)
+        .on_conflict_do_update(
+            index_elements=["name"],
+            set_={"position": position, "updated_at": now},
         )
+    )
+
+def set_pipeline_cursor(name, position):
+    session = get_session()
+    try:
+        session.execute(upsert_cursor_statement(name, position))
+        session.commit()
+    finally:
+        session.close()
+
+# Heartbeats use the database clock so skew between hosts cannot expire a live instance
+def _db_utcnow():
+    return func.timezone("UTC", func.now())
+
+def heartbeat_statement(instance_id):
+    return (
+        pg_insert(SchedulerInstance)
+        .values(instance_id=instance_id, started_at=_db_utcnow(), heartbeat_at=_db_utcnow())
+        .on_conflict_do_update(index_elements=["instance_id"], set_={"heartbeat_at": _db_utcnow()})
+    )
+
+def live_instances_statement(ttl_seconds):
+    return (
+        select(SchedulerInstance.instance_id)
+        .where(SchedulerInstance.heartbeat_at >= _db_utcnow() - timedelta(seconds=ttl_seconds))
+        .order_by(SchedulerInstance.instance_id)
+    )
+
+def expired_instances_statement(ttl_seconds):
+    return SchedulerInstance.__table__.delete().where(
+        SchedulerInstance.heartbeat_at < _db_utcnow() - timedelta(seconds=ttl_seconds)
+    )
+
+def log_job_alert(user_id, job_id):
+    record_job_alerts([(user_id, job_id)])
+
+# Claims (user, job) pairs not alerted within the dedup window and bumps the hourly
+# rollup in the same statement. Callers hold ALERT_CLAIM_LOCK, so concurrent claimers
+# see each other's committed rows and never double-send.
+CLAIM_ALERTS_SQL = text("""
+    WITH claimed AS (
+        INSERT INTO job_alerts (user_id, job_id, sent_at)
+        SELECT v.user_id, v.job_id, :now
+        FROM unnest(CAST(:user_ids AS uuid[]), CAST(:job_ids AS varchar[])) AS v(user_id, job_id)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM job_alerts a
+            WHERE a.user_id = v.user_id AND a.job_id = v.job_id AND a.sent_at > :dedup_since
+        )
+        RETURNING user_id, job_id
+    ), counted AS (
+        INSERT INTO job_alert_counts (user_id, hour, count)
+        SELECT user_id, date_trunc('hour', CAST(:now AS timestamp)), count(*) FROM claimed GROUP BY user_id
+        ON CONFLICT (user_id, hour) DO UPDATE SET count = job_alert_counts.count + EXCLUDED.count
+    )
+    SELECT user_id, job_id FROM claimed
+""").columns(user_id=PG_UUID(as_uuid=True), job_id=String)
+
+RELEASE_ALERTS_SQL = text("""
+    WITH released AS (
+        DELETE FROM job_alerts a
+        USING unnest(CAST(:user_ids AS uuid[]), CAST(:job_ids AS varchar[])) AS v(user_id, job_id)
+        WHERE a.user_id = v.user_id AND a.job_id = v.job_id AND a.sent_at > :dedup_since
+        RETURNING a.user_id, a.sent_at
+    )
+    UPDATE job_alert_counts c SET count = c.count - r.n
+    FROM (SELECT user_id, date_trunc('hour', sent_at) AS hour, count(*) AS n FROM released GROUP BY 1, 2) r
+    WHERE c.user_id = r.user_id AND c.hour = r.hour
+""")
+
+def alert_params(pairs) -> dict:
+    keys = {(str(UUID(str(user_id))), job_id) for user_id, job_id in pairs}
+    now = datetime.utcnow()
+    return {
+        "user_ids": [user_id for user_id, _ in keys],
+        "job_ids": [job_id for _, job_id in keys],
+        "now": now,
+        "dedup_since": now - timedelta(hours=ALERT_DEDUP_WINDOW_HOURS),
+    }
+
+# Queues matched alerts, skipping pairs already delivered within the dedup window or already
+# queued. A digest row joins the user's pending digest (same due time) or starts one due at
+# :digest_due. Callers hold ALERT_CLAIM_LOCK, as does confirmation, so a pair cannot be
+# queued again while its delivery is being recorded.
+ENQUEUE_ALERTS_SQL = text("""
+    INSERT INTO alert_outbox (user_id, job_id, chat_id, mode, payload, status, attempts, available_at, created_at)
+    SELECT v.user_id, v.job_id, v.chat_id, v.mode, CAST(v.payload AS jsonb), 'pending', 0,
+        CASE WHEN v.mode = 'digest' THEN COALESCE((
+            SELECT min(o.available_at) FROM alert_outbox o
+            WHERE o.user_id = v.user_id AND o.mode = 'digest' AND o.status = 'pending' AND o.attempts = 0
+        ), :digest_due) ELSE :now END,
+        :now
+    FROM unnest(
+        CAST(:user_ids AS uuid[]), CAST(:job_ids AS varchar[]), CAST(:chat_ids AS varchar[]),
+        CAST(:modes AS varchar[]), CAST(:payloads AS text[])
+    ) AS v(user_id, job_id, chat_id, mode, payload)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM job_alerts a
+        WHERE a.user_id = v.user_id AND a.job_id = v.job_id AND a.sent_at > :dedup_since
+    )
+    ON CONFLICT (user_id, job_id) DO NOTHING
+    RETURNING id
+""")
+
+# Leases due rows to one worker: SKIP LOCKED lets concurrent workers take disjoint batches, and
+# pushing available_at past the lease makes rows of a crashed worker due again afterwards
+CLAIM_OUTBOX_SQL = text("""
+    UPDATE alert_outbox o SET attempts = o.attempts + 1, available_at = :lease_until
+    FROM (
+        SELECT id FROM alert_outbox
+        WHERE status = 'pending' AND available_at <= :now
+        ORDER BY available_at, user_id, id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.id = due.id
+    RETURNING o.id, o.user_id, o.job_id, o.chat_id, o.mode, o.payload, o.attempts
+""").columns(user_id=PG_UUID(as_uuid=True), payload=JSONB)
+
+# Delivered rows leave the outbox and are recorded in job_alerts and the hourly rollup together
+CONFIRM_OUTBOX_SQL = text("""
+    WITH delivered AS (
+        DELETE FROM alert_outbox WHERE id = ANY(CAST(:ids AS bigint[]))
+        RETURNING user_id, job_id
+    ), recorded AS (
+        INSERT INTO job_alerts (user_id, job_id, sent_at)
+        SELECT user_id, job_id, :now FROM delivered
+        RETURNING user_id
+    ), counted AS (
+        INSERT INTO job_alert_counts (user_id, hour, count)
+        SELECT user_id, date_trunc('hour', CAST(:now AS timestamp)), count(*) FROM recorded GROUP BY user_id
+        ON CONFLICT (user_id, hour) DO UPDATE SET count = job_alert_counts.count + EXCLUDED.count
+    )
+    SELECT count(*) FROM recorded
+""")
+
+RETRY_OUTBOX_SQL = text("""
+    UPDATE alert_outbox o SET available_at = r.available_at, last_error = r.error
+    FROM unnest(CAST(:ids AS bigint[]), CAST(:available_ats AS timestamp[]), CAST(:errors AS text[]))
+        AS r(id, available_at, error)
+    WHERE o.id = r.id
+""")
+
+FAIL_OUTBOX_SQL = text("""
+    UPDATE alert_outbox o SET status = 'failed', last_error = r.error
+    FROM unnest(CAST(:ids AS bigint[]), CAST(:errors AS text[])) AS r(id, error)
+    WHERE o.id = r.id
+""")
+
+def enqueue_params(rows, digest_window_seconds=0) -> dict:
+    """rows: (user_id, job_id, chat_id, mode, payload JSON) tuples."""
+    now = datetime.utcnow()
+    return {
+        "user_ids": [str(UUID(str(row[0]))) for row in rows],
+        "job_ids": [row[1] for row in rows],
+        "chat_ids": [str(row[2]) for row in rows],
+        "modes": [row[3] for row in rows],
+        "payloads": [row[4] for row in rows],
+        "now": now,
+        "digest_due": now + timedelta(seconds=digest_window_seconds),
+        "dedup_since": now - timedelta(hours=ALERT_DEDUP_WINDOW_HOURS),
+    }
+
+def record_job_alerts(pairs):
+    """
+    Claim (user_id, job_id) pairs in one statement under a transaction-level advisory
+    lock, which makes this idempotent across processes; only pairs that were not
+    already recorded are returned.
+    """
+    params = alert_params(pairs)
+    if not params["user_ids"]:
+        return set()
+    session = get_session()
+    try:
+        session.execute(ADVISORY_XACT_LOCK_SQL, {"key": ALERT_CLAIM_LOCK})
+        claimed = {(row[0], row[1]) for row in session.execute(CLAIM_ALERTS_SQL, params)}
         session.commit()
+        return claimed
     finally:
         session.close()
 
+def release_job_alerts(pairs):
+    # Give back claims whose delivery failed so a later cycle can retry them
+    params = alert_params(pairs)
+    if not params["user_ids"]:
+        return
+    session = get_session()
+    try:
+        session.execute(RELEASE_ALERTS_SQL, params)
+        session.commit()
+    finally:
+        session.close()
+
+HAS_ALERT_SQL = text("SELECT 1 FROM job_alerts WHERE user_id = :user_id AND job_id = :job_id LIMIT 1")
+
+# Sliding one-hour window over the hourly rollup: the current hour plus the share of
+# the previous hour that still falls inside the window
+ALERT_COUNT_LAST_HOUR_SQL = text("""
+    SELECT CAST(CEIL(COALESCE(SUM(
+        CASE WHEN hour = :hour THEN count ELSE count * CAST(:previous_weight AS float8) END
+    ), 0)) AS integer)
+    FROM job_alert_counts
+    WHERE user_id = :user_id AND hour >= :previous_hour
+""")
+
+def alert_count_params(user_id) -> dict:
+    now = datetime.utcnow()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    return {
+        "user_id": UUID(str(user_id)),
+        "hour": hour,
+        "previous_hour": hour - timedelta(hours=1),
+        "previous_weight": 1 - (now - hour).total_seconds() / 3600,
+    }
+
 def has_alert_been_sent(user_id, job_id):
-    session = SessionLocal()
+    session = get_session()
     try:
-        result = session.execute(
-            text("SELECT 1 FROM job_alerts WHERE user_id = :user_id AND job_id = :job_id"),
-            {"user_id": user_id, "job_id": job_id}
-        ).fetchone()
+        result = session.execute(HAS_ALERT_SQL, {"user_id": user_id, "job_id": job_id}).fetchone()
         return result is not None
     finally:
         session.close()
 
 def alert_count_last_hour(user_id):
-    session = SessionLocal()
+    session = get_session()
     try:
-        result = session.execute(
-            text("""
-            SELECT COUNT(*) FROM job_alerts
-            WHERE user_id = :user_id AND sent_at > NOW() - INTERVAL '1 hour'
-            """),
-            {"user_id": user_id}
-        ).scalar()
+        result = session.execute(ALERT_COUNT_LAST_HOUR_SQL, alert_count_params(user_id)).scalar()
         return result
     finally:
         session.close()
 
 def get_all_alerts_for_users_and_jobs(user_ids, job_ids):
-    session = SessionLocal()
+    session = get_session()
     try:
         if not user_ids or not job_ids:
             return set()
@@ -0,0 +1,281 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy.engine import make_url
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from services.container import container
+from model.pipeline_cursor import PipelineCursor
+from model.scheduler_instance import SchedulerInstance
+from services.postgres import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SECONDS,
+    JOB_BATCH_SIZE, ALERT_CLAIM_LOCK, JOB_INSERT_LOCK,
+    job_rows, existing_job_ids_statement, insert_jobs_statement, job_to_dict, latest_jobs_statement, recent_job_ids_statement,
+    high_watermark_statement, jobs_after_seq_statement, initial_cursor_statements,
+    recent_job_rows_statement, job_rows_after_seq_statement,
+    upsert_cursor_statement, heartbeat_statement, live_instances_statement, expired_instances_statement,
+    least_shard_cursor_statement, expired_shard_cursors_statement,
+    alert_params, alert_count_params, enqueue_params,
+    ADVISORY_XACT_LOCK_SQL, CLAIM_ALERTS_SQL, RELEASE_ALERTS_SQL,
+    HAS_ALERT_SQL, ALERT_COUNT_LAST_HOUR_SQL,
+    ENQUEUE_ALERTS_SQL, CLAIM_OUTBOX_SQL, CONFIRM_OUTBOX_SQL, RETRY_OUTBOX_SQL, FAIL_OUTBOX_SQL,
+)
+from services.query_cache import bump_data_generation
+from services.recent_jobs import JobRecord, recent_jobs
+from services.metrics import instrument_engine
+
+# asyncpg keeps a per-connection LRU of prepared statements; SQLAlchemy reuses compiled SQL
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+
+def async_database_url(url: str):
+    url = make_url(url)
+    return url.set(drivername="postgresql+asyncpg").update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
+
+def _create_async_engine():
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+    instrument_engine(async_engine.sync_engine, "async")
+    return async_engine
+
+
+async def _warm_async_engine(async_engine):
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+container.register(
+    "postgres_async", _create_async_engine, warm=_warm_async_engine, close=lambda engine: engine.dispose()
+)
+
+
+def get_async_engine():
+    return container.get("postgres_async")
+
+
+def get_async_session() -> AsyncSession:
+    return AsyncSession(bind=get_async_engine(), expire_on_commit=False)
+
+
+async def new_job_rows(session, rows):
+    # Same as services.postgres.new_job_rows: skip ids already stored in any partition
+    existing = set()
+    for start in range(0, len(rows), JOB_BATCH_SIZE):
+        batch = [row["id"] for row in rows[start:start + JOB_BATCH_SIZE]]
+        existing.update((await session.execute(existing_job_ids_statement(batch))).scalars())
+    return [row for row in rows if row["id"] not in existing]
+
+
+async def save_jobs(jobs: list[dict]) -> list[str]:
+    async with get_async_session() as session:
+        try:
+            await session.execute(ADVISORY_XACT_LOCK_SQL, {"key": JOB_INSERT_LOCK})
+            rows = await new_job_rows(session, job_rows(jobs))
+            rows_by_id = {row["id"]: row for row in rows}
+            records = []
+            for start in range(0, len(rows), JOB_BATCH_SIZE):
+                result = await session.execute(insert_jobs_statement(rows[start:start + JOB_BATCH_SIZE]))
+                records.extend(JobRecord(rows_by_id[job_id], ingest_seq) for job_id, ingest_seq in result)
+            await session.commit()
+            new_ids = [record.id for record in records]
+            if new_ids:
+                # Visible to the API at once; the alert watermark only moves on the next sync
+                recent_jobs.add(records)
+                bump_data_generation()
+            logging.info(f"[DB] Saved {len(new_ids)} new of {len(jobs)} jobs")
+            return new_ids
+        except Exception as e:
+            logging.error(f"[DB] Error saving jobs: {e}")
+            await session.rollback()
+            return []
+
+
+async def load_recent_jobs():
+    """Rebuild the in-memory recent-jobs window from Postgres."""
+    async with get_async_session() as session:
+        high = (await session.execute(high_watermark_statement(0))).scalar() or 0
+        rows = (await session.execute(recent_job_rows_statement(recent_jobs.cutoff()))).all()
+    recent_jobs.replace([JobRecord(row._mapping, row.ingest_seq) for row in rows], high)
+    logging.info(f"[DB] Loaded {len(recent_jobs)} recent jobs into memory (ingest_seq {high})")
+
+
+async def sync_recent_jobs():
+    """Pull in rows other processes inserted since the window's high watermark."""
+    if not recent_jobs.loaded:
+        await load_recent_jobs()
+        return
+    async with get_async_session() as session:
+        rows = (await session.execute(job_rows_after_seq_statement(recent_jobs.high_seq))).all()
+    if rows:
+        recent_jobs.add([JobRecord(row._mapping, row.ingest_seq) for row in rows], max(row.ingest_seq for row in rows))
+        bump_data_generation()
+    else:
+        recent_jobs.expire()
+    recent_jobs.mark_synced()
+
+
+async def get_latest_jobs(minutes=10):
+    async with get_async_session() as session:
+        jobs = (await session.execute(latest_jobs_statement(minutes))).scalars().all()
+        return [job_to_dict(job) for job in jobs]
+
+
+async def get_recent_job_ids(hours=24):
+    async with get_async_session() as session:
+        return set((await session.execute(recent_job_ids_statement(hours))).scalars().all())
+
+
+async def get_jobs_after_seq(after_seq, minutes=10):
+    async with get_async_session() as session:
+        high = (await session.execute(high_watermark_statement(after_seq))).scalar()
+        if high is None:
+            return [], None
+        jobs = (await session.execute(jobs_after_seq_statement(after_seq, high, minutes))).scalars().all()
+        return [job_to_dict(job) for job in jobs], high
+
+
+async def get_pipeline_cursor(name, minutes=10):
+    async with get_async_session() as session:
+        cursor = await session.get(PipelineCursor, name)
+        if cursor is not None:
+            return cursor.position
+    return await get_initial_cursor(minutes)
+
+
+async def get_initial_cursor(minutes=10):
+    async with get_async_session() as session:
+        first_recent_statement, newest_statement = initial_cursor_statements(minutes)
+        first_recent = (await session.execute(first_recent_statement)).scalar()
+        if first_recent is not None:
+            return first_recent - 1
+        return (await session.execute(newest_statement)).scalar()
+
+
+async def get_shard_resume_cursor(fallback_name, minutes=10):
+    """
+    Where a shard starts after a restart or a membership change: the least advanced
+    persisted shard cursor, so users that moved between instances miss no jobs (the
+    few re-evaluated ones are dropped by job_alerts claims). Without shard cursors the
+    single-instance cursor `fallback_name` is used; never earlier than the alert window.
+    """
+    async with get_async_session() as session:
+        position = (await session.execute(least_shard_cursor_statement())).scalar()
+        if position is None:
+            cursor = await session.get(PipelineCursor, fallback_name)
+            position = cursor.position if cursor is not None else None
+    initial = await get_initial_cursor(minutes)
+    if position is None or initial is None:
+        return initial if position is None else position
+    return max(position, initial)
+
+
+async def set_pipeline_cursor(name, position):
+    async with get_async_session() as session:
+        await session.execute(upsert_cursor_statement(name, position))
+        await session.commit()
+
+
+async def heartbeat_instance(instance_id, ttl_seconds):
+    """Record that `instance_id` is alive and return the sorted IDs of all live instances."""
+    async with get_async_session() as session:
+        await session.execute(heartbeat_statement(instance_id))
+        members = (await session.execute(live_instances_statement(ttl_seconds))).scalars().all()
+        await session.commit()
+        return list(members)
+
+
+async def remove_instance(instance_id):
+    async with get_async_session() as session:
+        await session.execute(SchedulerInstance.__table__.delete().where(SchedulerInstance.instance_id == instance_id))
+        await session.commit()
+
+
+async def purge_expired_instances(ttl_seconds):
+    async with get_async_session() as session:
+        await session.execute(expired_instances_statement(ttl_seconds))
+        await session.execute(expired_shard_cursors_statement(ttl_seconds))
+        await session.commit()
+
+
+async def record_job_alerts(pairs):
+    params = alert_params(pairs)
+    if not params["user_ids"]:
+        return set()
+    async with get_async_session() as session:
+        await session.execute(ADVISORY_XACT_LOCK_SQL, {"key": ALERT_CLAIM_LOCK})
+        claimed = {(row[0], row[1]) for row in await session.execute(CLAIM_ALERTS_SQL, params)}
+        await session.commit()
+        return claimed
+
+
+async def release_job_alerts(pairs):
+    params = alert_params(pairs)
+    if not params["user_ids"]:
+        return
+    async with get_async_session() as session:
+        await session.execute(RELEASE_ALERTS_SQL, params)
+        await session.commit()
+
+
+async def enqueue_alerts(rows, digest_window_seconds=0):
+    """Queue (user_id, job_id, chat_id, mode, payload) rows for delivery; returns how many were new."""
+    if not rows:
+        return 0
+    async with get_async_session() as session:
+        await session.execute(ADVISORY_XACT_LOCK_SQL, {"key": ALERT_CLAIM_LOCK})
+        queued = (await session.execute(ENQUEUE_ALERTS_SQL, enqueue_params(rows, digest_window_seconds))).all()
+        await session.commit()
+        return len(queued)
+
+
+async def claim_outbox(limit, lease_seconds):
+    now = datetime.utcnow()
+    async with get_async_session() as session:
+        rows = (await session.execute(CLAIM_OUTBOX_SQL, {
+            "now": now, "lease_until": now + timedelta(seconds=lease_seconds), "limit": limit,
+        })).all()
+        await session.commit()
+        return rows
+
+
+async def complete_outbox(delivered, retries, failures):
+    """
+    delivered: outbox IDs Telegram accepted; retries: (id, available_at, error);
+    failures: (id, error) given up on. Returns the number of alerts recorded.
+    """
+    recorded = 0
+    async with get_async_session() as session:
+        if delivered:
+            await session.execute(ADVISORY_XACT_LOCK_SQL, {"key": ALERT_CLAIM_LOCK})
+            recorded = (await session.execute(CONFIRM_OUTBOX_SQL, {"ids": delivered, "now": datetime.utcnow()})).scalar()
+        if retries:
+            await session.execute(RETRY_OUTBOX_SQL, {
+                "ids": [r[0] for r in retries], "available_ats": [r[1] for r in retries], "errors": [r[2] for r in retries],
+            })
+        if failures:
+            await session.execute(FAIL_OUTBOX_SQL, {"ids": [f[0] for f in failures], "errors": [f[1] for f in failures]})
+        await session.commit()
+    return recorded
+
+
+async def has_alert_been_sent(user_id, job_id):
+    async with get_async_session() as session:
+        result = (await session.execute(HAS_ALERT_SQL, {"user_id": user_id, "job_id": job_id})).fetchone()
+        return result is not None
+
+
+async def alert_count_last_hour(user_id):
+    async with get_async_session() as session:
+        return (await session.execute(ALERT_COUNT_LAST_HOUR_SQL, alert_count_params(user_id))).scalar()
+
+
+async def close_async_engine():
+    await container.close("postgres_async")
@@ -0,0 +1,78 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+# Upper bound on staleness: the 24h window slides, and other processes don't see our bumps
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "60"))
+
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def get_data_generation() -> int:
+    return _generation
+
+
+def bump_data_generation() -> int:
+    """Called whenever new job rows are committed; invalidates every cached result."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        return _generation
+
+
+class QueryCache:
+    """Bounded LRU of query results, valid only for the data generation they were computed at."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (generation, stored_at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, generation: int):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_generation, stored_at, value = entry
+            if entry_generation != generation or time.monotonic() - stored_at > self.ttl_seconds:
+                del self.entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, generation: int, value):
+        with self.lock:
+            self.entries[key] = (generation, time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "generation": _generation,
+            }
+
+
+filtered_jobs_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
@@ -0,0 +1,223 @@
+import os
+import time
+import heapq
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from services.enrichment import job_search_text, job_tokens, job_skill_keys
+
+# Longest window anything reads from memory: the filtered-jobs API serves the last 24 hours
+RECENT_JOBS_WINDOW_HOURS = float(os.getenv("RECENT_JOBS_WINDOW_HOURS", "24"))
+# Other processes' inserts arrive through catch-up; past this age the API goes back to Postgres
+RECENT_JOBS_MAX_STALENESS_SECONDS = float(os.getenv("RECENT_JOBS_MAX_STALENESS_SECONDS", "150"))
+# "off" keeps every read on Postgres
+RECENT_JOBS_MODE = os.getenv("RECENT_JOBS_MODE", "memory")
+
+INDEXED_FIELDS = ("category", "type", "location", "skill_keys")
+
+
+class JobRecord:
+    """One stored job, as compact as the columns the notifier and the API read."""
+    __slots__ = (
+        "id", "title", "url", "type", "category", "description", "skills", "budget", "location",
+        "client_spend", "client_rating", "published_at", "ingest_seq", "search_text", "tokens",
+        "skill_keys",
+    )
+
+    def __init__(self, row: dict, ingest_seq: int):
+        self.id = row["id"]
+        self.title = row["title"]
+        self.url = row["url"]
+        self.type = row["type"]
+        self.category = row["category"]
+        self.description = row["description"]
+        self.skills = row["skills"] or []
+        self.budget = row["budget"]
+        self.location = row["location"]
+        self.client_spend = row["client_spend"]
+        self.client_rating = row["client_rating"]
+        self.published_at = row["published_at"]
+        self.ingest_seq = ingest_seq
+        self.search_text = job_search_text(row)
+        self.tokens = job_tokens(row)
+        self.skill_keys = job_skill_keys(row)
+
+    def to_dict(self) -> dict:
+        # Same shape as services.postgres.job_to_dict
+        return {
+            "title": self.title,
+            "id": self.id,
+            "url": self.url,
+            "type": self.type,
+            "category": self.category,
+            "description": self.description,
+            "skills": self.skills,
+            "budget": float(self.budget) if self.budget is not None else 0,
+            "location": self.location,
+            "client_spend": self.client_spend,
+            "client_rating": self.client_rating,
+            "published_at": self.published_at,
+            "search_text": self.search_text,
+            "tokens": self.tokens,
+            "skill_keys": self.skill_keys,
+            "ingest_seq": self.ingest_seq,
+        }
+
+
+def _order(record):
+    return record.published_at, record.id
+
+
+def _published(record):
+    return record.published_at
+
+
+def _field_contains(record, keyword):
+    # ILIKE matches title and description one at a time; search_text joins them with a space,
+    # so only a keyword containing a space can match across the two
+    if keyword not in record.search_text:
+        return False
+    return " " not in keyword or keyword in (record.title or "").lower() or keyword in (record.description or "").lower()
+
+
+def _index_values(record, field):
+    # A job is listed under each of its skills
+    return getattr(record, field) if field == "skill_keys" else (getattr(record, field),)
+
+
+class RecentJobs:
+    """
+    Jobs published within the window, ordered by (published_at, id), with per-value index
+    lists for category, type, location and skill kept in the same order. Expiry trims the oldest
+    end of every list. Fed by save_jobs as it inserts, rebuilt from Postgres at startup
+    and caught up by ingest_seq for rows other processes inserted. Only Postgres reads
+    advance `high_seq`: another writer may commit rows below this process's own inserts.
+    """
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.records = []
+        self.by_id = {}
+        self.indexes = {field: {} for field in INDEXED_FIELDS}
+        self.high_seq = 0  # ingest_seq Postgres has been read up to, including rows too old to keep
+        self.loaded = False
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def cutoff(self) -> datetime:
+        return datetime.utcnow() - self.window
+
+    def replace(self, records, high_seq):
+        self.records, self.by_id = [], {}
+        self.indexes = {field: {} for field in INDEXED_FIELDS}
+        self.high_seq = 0
+        self.add(records, high_seq)
+        self.loaded = True
+        self.mark_synced()
+
+    def add(self, records, high_seq=0):
+        cutoff = self.cutoff()
+        for record in records:
+            if record.published_at < cutoff or record.id in self.by_id:
+                continue
+            self.by_id[record.id] = record
+            # Jobs arrive roughly in publish order, so these inserts land at or near the end
+            insort(self.records, record, key=_order)
+            for field in INDEXED_FIELDS:
+                for value in _index_values(record, field):
+                    insort(self.indexes[field].setdefault(value, []), record, key=_order)
+        self.high_seq = max(self.high_seq, high_seq)
+        self.expire(cutoff)
+
+    def expire(self, cutoff=None):
+        cutoff = cutoff or self.cutoff()
+        expired = bisect_left(self.records, cutoff, key=_published)
+        if not expired:
+            return
+        for record in self.records[:expired]:
+            del self.by_id[record.id]
+        del self.records[:expired]
+        for index in self.indexes.values():
+            for value in list(index):
+                records = index[value]
+                del records[:bisect_left(records, cutoff, key=_published)]
+                if not records:
+                    del index[value]
+
+    def mark_synced(self):
+        self.synced_at = time.monotonic()
+
+    def fresh(self) -> bool:
+        return (
+            RECENT_JOBS_MODE == "memory" and self.loaded
+            and time.monotonic() - self.synced_at <= RECENT_JOBS_MAX_STALENESS_SECONDS
+        )
+
+    def published_since(self, since: datetime):
+        return self.records[bisect_left(self.records, since, key=_published):]
+
+    def latest(self, minutes) -> list[dict]:
+        return [record.to_dict() for record in self.published_since(datetime.utcnow() - timedelta(minutes=minutes))]
+
+    def after_seq(self, after_seq, minutes):
+        """Same contract as get_jobs_after_seq: (jobs ingested after `after_seq` and published within `minutes`, high watermark)."""
+        if self.high_seq <= after_seq:
+            return [], None
+        since = datetime.utcnow() - timedelta(minutes=minutes)
+        # Local inserts past the watermark wait for the sync that confirms nothing below them is missing
+        records = [r for r in self.published_since(since) if after_seq < r.ingest_seq <= self.high_seq]
+        records.sort(key=lambda r: r.ingest_seq)
+        return [record.to_dict() for record in records], self.high_seq
+
+    def search(self, since, categories, keywords=(), client_locations=(), exclude_locations=(),
+               min_client_rating=None, job_types=(), skills=(), skills_match="any"):
+        """Records matching the filtered-jobs API predicates, newest first. `skills` are lowercased."""
+        # Walk the smallest of the indexed candidate sets; the other predicates are checked per record
+        drivers = [(field, set(values)) for field, values in (
+            ("category", categories), ("type", job_types), ("location", client_locations),
+        ) if values]
+        skills = frozenset(skills)
+        if skills and skills_match == "all":
+            drivers += [("skill_keys", {skill}) for skill in skills]
+        elif skills:
+            drivers.append(("skill_keys", set(skills)))
+        field, values = min(drivers, key=lambda d: sum(len(self.indexes[d[0]].get(v, ())) for v in d[1]))
+        lists = [self.indexes[field].get(value, []) for value in values]
+        candidates = heapq.merge(
+            *(records[bisect_left(records, since, key=_published):] for records in lists), key=_order
+        )
+
+        categories, job_types = set(categories), set(job_types)
+        client_locations, exclude_locations = set(client_locations), set(exclude_locations)
+        keywords = [kw.lower() for kw in keywords]
+        matches = []
+        previous = None
+        for record in candidates:
+            # A record listed under several of the driving skills comes up once per skill, in a row
+            if record is previous:
+                continue
+            previous = record
+            if record.category not in categories:
+                continue
+            if job_types and record.type not in job_types:
+                continue
+            if client_locations and record.location not in client_locations:
+                continue
+            # NOT IN excludes NULL locations in SQL too
+            if exclude_locations and (record.location is None or record.location in exclude_locations):
+                continue
+            if min_client_rating is not None and (record.client_rating is None or record.client_rating < min_client_rating):
+                continue
+            if skills and skills_match == "all" and not skills <= record.skill_keys:
+                continue
+            if skills and skills_match == "any" and skills.isdisjoint(record.skill_keys):
+                continue
+            if keywords and not all(_field_contains(record, kw) for kw in keywords):
+                continue
+            matches.append(record)
+        matches.reverse()
+        return matches
+
+
+recent_jobs = RecentJobs(timedelta(hours=RECENT_JOBS_WINDOW_HOURS))
@@ -1,41 +1,204 @@
 import os
-from supabase import create_client, Client
+import time
+import logging
+from datetime import datetime
+from services.container import container
+from services.metrics import SUPABASE_CALLS
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Use service key for backend
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _create_supabase():
+    # The client library takes ~0.4s to import; only pay for it when Supabase is first used
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def get_users_with_filters_and_telegram():
-    from datetime import datetime
+
+container.register("supabase", _create_supabase)
+
+
+def get_supabase():
+    return container.get("supabase")
+
+
+PAGE_SIZE = 1000  # PostgREST caps rows per response
+IN_CHUNK_SIZE = 150  # ids per in_() filter, keeps request URLs short
+FULL_REFRESH_SECONDS = int(os.getenv("SUBSCRIBER_FULL_REFRESH_SECONDS", "600"))
+# Column used to pick up new/changed filters between full refreshes. With the default
+# created_at only new filters show up incrementally; edits (keywords, categories, prices)
+# and deletions wait for the next full refresh, up to FULL_REFRESH_SECONDS. Point it at an
+# updated_at column to pick up edits each cycle (deletions still wait for the full refresh)
+FILTER_CHANGE_COLUMN = os.getenv("SUPABASE_FILTER_CHANGE_COLUMN", "created_at")
+# "instant" (one message per job) or "digest" (one grouped message per cycle/window)
+DEFAULT_DELIVERY_MODE = os.getenv("TELEGRAM_DELIVERY_MODE", "instant")
+# Optional profiles column holding a per-user delivery mode that overrides the default
+DELIVERY_MODE_COLUMN = os.getenv("SUPABASE_DELIVERY_MODE_COLUMN")
+# Table of per-filter skills (filter_id, skill); unset runs without skill filters, since
+# the table is not part of the base Supabase schema
+FILTER_SKILLS_TABLE = os.getenv("SUPABASE_FILTER_SKILLS_TABLE", "")
+
+
+def _fetch_all(table, build_query):
+    # Range paging is only consistent over a total order, so build_query must set one
+    rows = []
+    start = 0
+    while True:
+        SUPABASE_CALLS.labels(table, "select").inc()
+        page = build_query().range(start, start + PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _fetch_in(table, column, values, order):
+    rows = []
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        chunk = values[start:start + IN_CHUNK_SIZE]
+
+        def build_query():
+            query = get_supabase().table(table).select("*").in_(column, chunk)
+            for key in order:
+                query = query.order(key)
+            return query
+
+        rows.extend(_fetch_all(table, build_query))
+    return rows
+
+
+def _fetch_eligible_profiles():
     now = datetime.utcnow().isoformat()
-    profiles = supabase.table("profiles") \
-        .select("*") \
-        .neq("telegram_id", None) \
-        .or_(f"is_paid.eq.true,trial_end.gte.{now}") \
-        .execute().data
-    result = []
-    for user in profiles:
-        filters = supabase.table("filters").select("*").eq("user_id", user["id"]).execute().data
-        user_filters = []
-        for f in filters:
-            keywords = [k["keyword"] for k in supabase.table("filter_keywords").select("*").eq("filter_id", f["id"]).execute().data]
-            categories = [c["category"] for c in supabase.table("filter_categories").select("*").eq("filter_id", f["id"]).execute().data]
-            user_filters.append({
-                "id": f["id"],
-                "name": f["name"],
-                "min_price": float(f["min_price"]) if f["min_price"] is not None else None,
-                "max_price": float(f["max_price"]) if f["max_price"] is not None else None,
-                "keywords": keywords,
-                "categories": categories
-            })
-        result.append({
-            "user_id": user["id"],
-            "telegram_id": user["telegram_id"],
-            "filters": user_filters
-        })
-    return result
+    columns = "id, telegram_id" + (f", {DELIVERY_MODE_COLUMN}" if DELIVERY_MODE_COLUMN else "")
+    return _fetch_all("profiles", lambda: get_supabase().table("profiles")
+                                  .select(columns)
+                                  .neq("telegram_id", None)
+                                  .or_(f"is_paid.eq.true,trial_end.gte.{now}")
+                                  .order("id"))
+
+
+def _build_filters(filters):
+    filter_ids = [f["id"] for f in filters]
+    keywords = {}
+    for k in _fetch_in("filter_keywords", "filter_id", filter_ids, ("filter_id", "keyword")):
+        keywords.setdefault(k["filter_id"], []).append(k["keyword"])
+    categories = {}
+    for c in _fetch_in("filter_categories", "filter_id", filter_ids, ("filter_id", "category")):
+        categories.setdefault(c["filter_id"], []).append(c["category"])
+    skills = {}
+    if FILTER_SKILLS_TABLE:
+        for s in _fetch_in(FILTER_SKILLS_TABLE, "filter_id", filter_ids, ("filter_id", "skill")):
+            skills.setdefault(s["filter_id"], []).append(s["skill"])
+    return {
+        f["id"]: {
+            "id": f["id"],
+            "user_id": f["user_id"],
+            "name": f["name"],
+            "min_price": float(f["min_price"]) if f["min_price"] is not None else None,
+            "max_price": float(f["max_price"]) if f["max_price"] is not None else None,
+            "keywords": keywords.get(f["id"], []),
+            "categories": categories.get(f["id"], []),
+            "skills": skills.get(f["id"], []),
+            "changed_at": f.get(FILTER_CHANGE_COLUMN),
+        }
+        for f in filters
+    }
+
+
+class SubscriberRegistry:
+    """
+    In-memory copy of eligible users and their filters, loaded with a constant number
+    of bulk queries. Profiles are re-read every call (eligibility changes with trials
+    and payments); filters are fetched only for new users or when they changed, with a
+    full reload every FULL_REFRESH_SECONDS to pick up edits and deletions. `version`
+    changes only when the returned subscriber list does.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.users = []
+        self.profiles = {}  # user_id -> (telegram_id, delivery_mode)
+        self.filters = {}  # filter_id -> built filter
+        self.watermark = None  # newest FILTER_CHANGE_COLUMN value seen
+        self.loaded_at = 0.0
+
+    def _merge_filters(self, built):
+        # Only called with fully fetched filters, so a failed query never leaves partial state
+        for f in built.values():
+            self.filters[f["id"]] = f
+            if f["changed_at"] and (self.watermark is None or f["changed_at"] > self.watermark):
+                self.watermark = f["changed_at"]
+
+    def refresh(self):
+        profiles = {
+            p["id"]: (p["telegram_id"], p.get(DELIVERY_MODE_COLUMN) or DEFAULT_DELIVERY_MODE)
+            for p in _fetch_eligible_profiles()
+        }
+        changed = profiles != self.profiles
+
+        if time.monotonic() - self.loaded_at >= FULL_REFRESH_SECONDS:
+            started = datetime.utcnow().isoformat() + "+00:00"
+            built = _build_filters(_fetch_in("filters", "user_id", profiles.keys(), ("id",)))
+            previous = self.filters
+            self.filters = {}
+            self.watermark = None
+            self._merge_filters(built)
+            self.loaded_at = time.monotonic()
+            changed = changed or self.filters != previous
+            if not self.filters:
+                # Nothing to take a watermark from yet: anything created from now on is new
+                self.watermark = started
+            elif self.watermark is None:
+                logging.warning(
+                    f"[Supabase] filters.{FILTER_CHANGE_COLUMN} is empty; filter changes of existing users "
+                    f"are only picked up by the full refresh every {FULL_REFRESH_SECONDS}s"
+                )
+        else:
+            new_users = profiles.keys() - self.profiles.keys()
+            known_users = profiles.keys() & self.profiles.keys()
+            fresh = _fetch_in("filters", "user_id", new_users, ("id",))
+            # Without a watermark (no FILTER_CHANGE_COLUMN values) there is nothing to compare
+            # against; the periodic full refresh covers it instead of a full read every cycle
+            if known_users and self.watermark is not None:
+                # One query for everything changed since the watermark, regardless of user count
+                watermark = self.watermark
+                changed_filters = _fetch_all(
+                    "filters",
+                    lambda: get_supabase().table("filters").select("*").gt(FILTER_CHANGE_COLUMN, watermark).order("id")
+                )
+                fresh += [f for f in changed_filters if f["user_id"] in known_users]
+            if fresh:
+                self._merge_filters(_build_filters(fresh))
+                changed = True
+
+        self.profiles = profiles
+        if changed or not self.version:
+            filters_by_user = {}
+            for f in self.filters.values():
+                filters_by_user.setdefault(f["user_id"], []).append(f)
+            self.users = [
+                {
+                    "user_id": user_id,
+                    "telegram_id": telegram_id,
+                    "delivery_mode": delivery_mode,
+                    "filters": filters_by_user.get(user_id, []),
+                }
+                for user_id, (telegram_id, delivery_mode) in profiles.items()
+            ]
+            self.version += 1
+            logging.info(f"[Supabase] Subscriber registry v{self.version}: {len(self.users)} users, {len(self.filters)} filters")
+        return self.users
+
+
+registry = SubscriberRegistry()
+
+def get_users_with_filters_and_telegram():
+    return registry.refresh()
+
+def get_subscribers_version():
+    return registry.version
 
 def update_user_telegram_id(user_id: str, chat_id: int):
-    response = supabase.table("profiles").update({"telegram_id": str(chat_id)}).eq("id", user_id).execute()
+    SUPABASE_CALLS.labels("profiles", "update").inc()
+    response = get_supabase().table("profiles").update({"telegram_id": str(chat_id)}).eq("id", user_id).execute()
     return response 
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+import httpx
+from services.container import container
+from services.metrics import TELEGRAM_SEND_DURATION, TELEGRAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+# Overridable for a local Bot API server or a stub (benchmarks)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Telegram allows ~30 messages/s per bot and about one message/s per chat
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
+PER_CHAT_BURST = float(os.getenv("TELEGRAM_PER_CHAT_BURST", "3"))
+MAX_CONCURRENCY = int(os.getenv("TELEGRAM_MAX_CONCURRENCY", "20"))
+MAX_ATTEMPTS = int(os.getenv("TELEGRAM_MAX_ATTEMPTS", "4"))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until and not self.lock.locked()
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: Any
+    ref: Any = None
+    ok: bool = False
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    retryable: bool = False
+
+
+class TelegramDeliveryEngine:
+    """
+    Sends Bot API messages over one pooled keep-alive client, concurrently, within
+    Telegram's global and per-chat limits. Every send reports a DeliveryResult.
+    """
+
+    def __init__(self, bot_token: str):
+        self.bot_token = bot_token
+        self.client: Optional[httpx.AsyncClient] = None
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets: dict = {}
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                base_url=f"{TELEGRAM_API_URL}/bot{self.bot_token}",
+                timeout=httpx.Timeout(10, connect=5),
+                limits=httpx.Limits(
+                    max_connections=MAX_CONCURRENCY,
+                    max_keepalive_connections=MAX_CONCURRENCY,
+                    keepalive_expiry=120,
+                ),
+            )
+        return self.client
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                now = time.monotonic()
+                self.chat_buckets = {k: b for k, b in self.chat_buckets.items() if not b.is_idle(now)}
+            bucket = TokenBucket(PER_CHAT_RATE, PER_CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def send(self, method: str, payload: dict, ref=None) -> DeliveryResult:
+        chat_id = payload.get("chat_id")
+        result = DeliveryResult(chat_id=chat_id, ref=ref)
+        chat_bucket = self._chat_bucket(chat_id)
+        while result.attempts < MAX_ATTEMPTS:
+            result.attempts += 1
+            # Wait for the chat's own budget before taking a connection slot, so one
+            # busy chat cannot starve everybody else
+            await chat_bucket.acquire()
+            async with self.semaphore:
+                await self.global_bucket.acquire()
+                started = time.perf_counter()
+                try:
+                    response = await self._get_client().post(f"/{method}", data=payload)
+                except httpx.HTTPError as e:
+                    response = None
+                    result.status_code = None
+                    result.error = f"{type(e).__name__}: {e}"
+                TELEGRAM_SEND_DURATION.labels(method).observe(time.perf_counter() - started)
+                TELEGRAM_RESPONSES.labels(method, str(response.status_code) if response is not None else "error").inc()
+
+            if response is None:
+                result.retryable = True
+                await _backoff(result)
+                continue
+
+            result.status_code = response.status_code
+            if response.status_code == 200:
+                result.ok = True
+                result.error = None
+                result.retryable = False
+                return result
+
+            body = _json_or_empty(response)
+            result.error = body.get("description") or response.text[:200]
+            if response.status_code == 429:
+                retry_after = (body.get("parameters") or {}).get("retry_after") \
+                    or response.headers.get("Retry-After") or 1
+                # Flood limits can be bot-wide, so every other send holds back too
+                chat_bucket.block_for(float(retry_after))
+                self.global_bucket.block_for(float(retry_after))
+                result.retryable = True
+                continue
+            if response.status_code >= 500:
+                result.retryable = True
+                await _backoff(result)
+                continue
+            # 400/403 etc: bad payload, chat not found or bot blocked by the user
+            result.retryable = False
+            return result
+        return result
+
+    async def call(self, method: str, payload: dict) -> dict:
+        """A single Bot API call outside the message rate limits (e.g. setWebhook); returns the decoded body."""
+        started = time.perf_counter()
+        response = await self._get_client().post(f"/{method}", json=payload)
+        TELEGRAM_SEND_DURATION.labels(method).observe(time.perf_counter() - started)
+        TELEGRAM_RESPONSES.labels(method, str(response.status_code)).inc()
+        return _json_or_empty(response)
+
+    async def send_many(self, messages) -> list[DeliveryResult]:
+        """Send (method, payload, ref) tuples concurrently and return results in order."""
+        return await asyncio.gather(*(self.send(method, payload, ref) for method, payload, ref in messages))
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+async def _backoff(result: DeliveryResult):
+    # No wait after the last attempt: the worker moves on to the next message
+    if result.attempts < MAX_ATTEMPTS:
+        await asyncio.sleep(min(2 ** result.attempts, 30))
+
+
+def _json_or_empty(response: httpx.Response) -> dict:
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _create_delivery_engine() -> TelegramDeliveryEngine:
+    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not bot_token:
+        logger.error("TELEGRAM_BOT_TOKEN not set in environment variables")
+        raise Exception("TELEGRAM_BOT_TOKEN not set in environment variables")
+    return TelegramDeliveryEngine(bot_token)
+
+
+container.register("telegram", _create_delivery_engine, close=lambda engine: engine.aclose())
+
+
+def get_delivery_engine() -> TelegramDeliveryEngine:
+    return container.get("telegram")
+
+
+async def close_delivery_engine():
+    await container.close("telegram")
@@ -0,0 +1,86 @@
+import os
+import asyncio
+import logging
+from services.supabase import update_user_telegram_id
+from services.telegram_delivery import get_delivery_engine
+from services.metrics import TELEGRAM_LINKS
+from services.telegram_messages import WELCOME_MESSAGE, LINKED_MESSAGE, USER_NOT_FOUND_MESSAGE, LINK_FAILED_MESSAGE
+
+# "polling": utils/telegram_link_bot.py runs as its own process and calls /api/link-telegram
+# "webhook": Telegram posts updates to /api/telegram/webhook and accounts are linked in-process
+TELEGRAM_BOT_MODE = os.getenv("TELEGRAM_BOT_MODE", "polling")
+# Public HTTPS URL of the webhook route, registered with Telegram at startup
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+# Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token; requests without it are rejected (required)
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Concurrent update deliveries Telegram may open to the webhook
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+
+async def link_telegram_account(user_id: str, chat_id: int) -> bool:
+    """Store the chat id on the user's profile; False when there is no such profile."""
+    # Supabase's client is synchronous; keep it off the event loop
+    response = await asyncio.to_thread(update_user_telegram_id, user_id, chat_id)
+    linked = bool(response.data)
+    TELEGRAM_LINKS.labels("linked" if linked else "not_found").inc()
+    return linked
+
+
+def start_command_args(text: str):
+    """Arguments of a /start (or /start@BotName) command, or None for any other message."""
+    command, _, args = (text or "").partition(" ")
+    if command.split("@")[0] != "/start":
+        return None
+    return args.split()
+
+
+async def reply(chat_id, text: str, html: bool = False):
+    payload = {"chat_id": chat_id, "text": text, "disable_web_page_preview": True}
+    if html:
+        payload["parse_mode"] = "HTML"
+    result = await get_delivery_engine().send("sendMessage", payload)
+    if not result.ok:
+        logging.warning(f"[TelegramBot] Reply to chat_id={chat_id} failed: {result.status_code} {result.error}")
+
+
+async def handle_update(update: dict):
+    """Process one webhook update: /start <profile id> links the chat to that profile."""
+    message = update.get("message") or {}
+    chat_id = (message.get("chat") or {}).get("id")
+    args = start_command_args(message.get("text"))
+    if chat_id is None or args is None:
+        return
+    if not args:
+        await reply(chat_id, WELCOME_MESSAGE)
+        return
+    user_id = args[0]
+    try:
+        linked = await link_telegram_account(user_id, chat_id)
+    except Exception:
+        TELEGRAM_LINKS.labels("failed").inc()
+        logging.exception(f"[TelegramBot] Failed to link chat_id={chat_id} to user_id={user_id}")
+        await reply(chat_id, LINK_FAILED_MESSAGE)
+        return
+    if linked:
+        logging.info(f"[TelegramBot] Linked chat_id={chat_id} to user_id={user_id}")
+        await reply(chat_id, LINKED_MESSAGE, html=True)
+    else:
+        logging.info(f"[TelegramBot] No profile found for user_id={user_id}")
+        await reply(chat_id, USER_NOT_FOUND_MESSAGE, html=True)
+
+
+async def register_webhook():
+    """Point the bot at this app's webhook route (replaces long polling for the bot token)."""
+    if not TELEGRAM_WEBHOOK_URL or not TELEGRAM_WEBHOOK_SECRET:
+        logging.error("[TelegramBot] TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET are required, webhook not registered")
+        return
+    body = await get_delivery_engine().call("setWebhook", {
+        "url": TELEGRAM_WEBHOOK_URL,
+        "secret_token": TELEGRAM_WEBHOOK_SECRET,
+        "allowed_updates": ["message"],
+        "max_connections": TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    })
+    if body.get("ok"):
+        logging.info(f"[TelegramBot] Webhook registered at {TELEGRAM_WEBHOOK_URL}")
+    else:
+        logging.error(f"[TelegramBot] Webhook registration failed: {body.get('description')}")
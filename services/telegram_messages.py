@@ -0,0 +1,15 @@
+# Replies of the account-linking bot, shared by the API's webhook handler and the standalone
+# polling bot; no imports, so the bot process does not load the backend's services
+
+WELCOME_MESSAGE = (
+    "👋 Welcome to Freelancelot Alert Bot!\n\n"
+    "Get instant Upwork job alerts from Freelancelot.app right here on Telegram.\n\n"
+    "To link your account, please copy the /start command from your dashboard: https://freelancelot.app/profile\n\n"
+    "If you need help, visit our website or contact support."
+)
+LINKED_MESSAGE = (
+    "✅ Your Telegram is now linked! Please create job filters on "
+    "<a href='https://freelancelot.app/dashboard'>dashboard</a> to start recieving job alerts."
+)
+USER_NOT_FOUND_MESSAGE = "⚠️ User not found. Please signup first on <a href='https://freelancelot.app'>Freelancelot</a>."
+LINK_FAILED_MESSAGE = "⚠️ Failed to link Telegram. Please try again or contact support."
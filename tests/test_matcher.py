@@ -0,0 +1,134 @@
+import random
+
+import pytest
+
+from benchmarks import synthetic
+from services.apify_scrapper import normalize_item
+from services.enrichment import enrich_jobs
+from services.matcher import FilterIndex
+from services.notification import match_jobs_to_filter
+
+SEEDS = range(5)
+
+
+def randomized_users(seed):
+    """Synthetic subscribers, with the optional filter attributes the registry does not fill yet."""
+    rng = random.Random(seed)
+    users = synthetic.users_with_filters(synthetic.subscribers(150, seed=seed))
+    for user in users:
+        for f in user["filters"]:
+            if rng.random() < 0.3:
+                f["job_types"] = rng.sample(["FIXED", "HOURLY"], 1)
+            if rng.random() < 0.3:
+                f["client_locations"] = rng.sample(synthetic.COUNTRIES, rng.randint(1, 3))
+            if rng.random() < 0.3:
+                f["exclude_locations"] = rng.sample(synthetic.COUNTRIES, rng.randint(1, 2))
+            if rng.random() < 0.3:
+                f["min_client_rating"] = rng.choice([3.0, 4.0, 4.5])
+            if rng.random() < 0.2:
+                f["min_price"] = rng.choice([0, 100, 500])
+            if rng.random() < 0.2:
+                f["max_price"] = rng.choice([100, 1000])
+            if rng.random() < 0.1:
+                f["keywords"] = []
+            if rng.random() < 0.1:
+                f["categories"] = []
+            # "go" and "react" also occur inside longer words, so the two modes disagree
+            if rng.random() < 0.2:
+                f["keywords"] = f["keywords"] + [rng.choice(["go", "react", "app", "machine learning"])]
+            f["match_mode"] = rng.choice([None, "word", "substring"])
+    return users
+
+
+def randomized_jobs(seed):
+    rng = random.Random(seed)
+    jobs = enrich_jobs([normalize_item(item) for item in synthetic.apify_items(400, seed=seed)])
+    for job in jobs:
+        job["id"] = job["url"]
+        if rng.random() < 0.1:
+            job["budget"] = None
+        if rng.random() < 0.1:
+            job["client_rating"] = None
+        if rng.random() < 0.1:
+            job["location"] = None
+        if rng.random() < 0.1:
+            job["skills"], job["skill_keys"] = [], []
+        if rng.random() < 0.1:
+            # Rows stored before enrichment existed
+            for field in ("search_text", "tokens", "skill_keys"):
+                del job[field]
+    return jobs
+
+
+def expected_pairs(users, job):
+    return {
+        (user["user_id"], f["id"])
+        for user in users
+        for f in user["filters"]
+        if match_jobs_to_filter([job], f)
+    }
+
+
+def pairs_of(index, filter_ids):
+    return {
+        (index.users[user_pos]["user_id"], f["id"])
+        for user_pos, f in (index.filters[filter_id] for filter_id in filter_ids)
+    }
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_keyword_automaton_index_matches_match_jobs_to_filter(seed):
+    users, jobs = randomized_users(seed), randomized_jobs(seed)
+    index = FilterIndex(users)
+    for job in jobs:
+        assert index.match(job) == expected_pairs(users, job)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_mask_matches_match_jobs_to_filter(seed):
+    users, jobs = randomized_users(seed), randomized_jobs(seed)
+    index = FilterIndex(users)
+    for job, filter_ids in zip(jobs, index.match_filters_batch(jobs)):
+        assert pairs_of(index, filter_ids.tolist()) == expected_pairs(users, job)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_users_match_per_job_users(seed):
+    users, jobs = randomized_users(seed), randomized_jobs(seed)
+    index = FilterIndex(users)
+    for job, batch_users in index.match_users_batch(jobs):
+        assert batch_users == index.match_users(job)
+
+
+def test_substring_keyword_spans_title_and_description():
+    """Alert text is `title + ' ' + description`, as before enrichment, so a keyword may cross the join."""
+    job = enrich_jobs([{
+        "id": "job-1", "title": "Need a Big", "url": "https://www.upwork.com/jobs/~01", "type": "FIXED",
+        "category": "Writing", "description": "Data engineer", "skills": [], "budget": 100, "location": "Germany",
+        "client_spend": 0, "client_rating": 5.0, "published_at": "2026-01-01 00:00:00",
+    }])[0]
+    assert job["search_text"] == "need a big data engineer"
+    users = [{"user_id": "u1", "telegram_id": "1", "filters": [
+        {"id": 1, "keywords": ["big data"], "categories": ["Writing"], "match_mode": "substring"},
+    ]}]
+    assert match_jobs_to_filter([job], users[0]["filters"][0]) == [job]
+    assert FilterIndex(users).match(job) == {("u1", 1)}
+
+
+@pytest.mark.parametrize("description, matches", [
+    ("Mybig datasets need cleaning, big and data people welcome", False),
+    ("Big datasets, and the data is big", False),
+    ("We need a big data engineer", True),
+    ("Senior BIG DATA engineer", True),
+])
+def test_word_mode_keyword_needs_its_words_in_a_row(description, matches):
+    job = enrich_jobs([{
+        "id": "job-1", "title": "Engineer", "url": "https://www.upwork.com/jobs/~01", "type": "FIXED",
+        "category": "Writing", "description": description, "skills": [], "budget": 100, "location": "Germany",
+        "client_spend": 0, "client_rating": 5.0, "published_at": "2026-01-01 00:00:00",
+    }])[0]
+    users = [{"user_id": "u1", "telegram_id": "1", "filters": [
+        {"id": 1, "keywords": ["big data"], "categories": [], "match_mode": "word"},
+    ]}]
+    assert bool(match_jobs_to_filter([job], users[0]["filters"][0])) is matches
+    assert FilterIndex(users).match(job) == ({("u1", 1)} if matches else set())
@@ -0,0 +1,133 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks import synthetic
+from routers import jobs as jobs_router
+from services.apify_scrapper import normalize_item
+from services.enrichment import enrich_jobs, skill_keys
+from services.recent_jobs import JobRecord, RecentJobs
+
+SEEDS = range(5)
+
+
+def randomized_rows(seed):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    rows = enrich_jobs([normalize_item(item) for item in synthetic.apify_items(600, seed=seed, minutes=30 * 60)])
+    for n, row in enumerate(rows):
+        row["id"] = row["url"].split("~")[-1]
+        row["published_at"] = now - timedelta(seconds=rng.uniform(0, 30 * 3600))
+        if n and n % 7 == 0:
+            # Same publish time as the previous job, so ordering falls back to the id
+            row["published_at"] = rows[n - 1]["published_at"]
+        if rng.random() < 0.1:
+            row["location"] = None
+        if rng.random() < 0.1:
+            row["client_rating"] = None
+        if rng.random() < 0.1:
+            row["skills"], row["skill_keys"] = [], []
+    return rows
+
+
+def sql_reference(rows, since, categories, keywords, client_locations, exclude_locations,
+                  min_client_rating, job_types, skills, skills_match):
+    """The WHERE and ORDER BY that routers/jobs.py builds for substring keyword queries, row by row."""
+    def ilike(value, kw):
+        return kw.lower() in (value or "").lower()
+
+    matches = []
+    for row in rows:
+        if row["category"] not in categories or row["published_at"] < since:
+            continue
+        # Each keyword ILIKE '%kw%' on title OR description, all keywords required
+        if not all(ilike(row["title"], kw) or ilike(row["description"], kw) for kw in keywords):
+            continue
+        if client_locations and row["location"] not in client_locations:
+            continue
+        # NOT IN is never true for NULL
+        if exclude_locations and (row["location"] is None or row["location"] in exclude_locations):
+            continue
+        if min_client_rating is not None and (row["client_rating"] is None or row["client_rating"] < min_client_rating):
+            continue
+        if job_types and row["type"] not in job_types:
+            continue
+        # && for any, @> for all
+        if skills and skills_match == "any" and not set(skills) & set(row["skill_keys"]):
+            continue
+        if skills and skills_match == "all" and not set(skills) <= set(row["skill_keys"]):
+            continue
+        matches.append(row)
+    matches.sort(key=lambda row: (row["published_at"], row["id"]), reverse=True)
+    return [row["id"] for row in matches]
+
+
+def random_query(rng, rows):
+    keywords = []
+    for _ in range(rng.choice([0, 0, 1, 1, 2])):
+        kind = rng.random()
+        if kind < 0.4:
+            keywords.append(rng.choice(synthetic.WORDS + synthetic.SKILLS))
+        elif kind < 0.7:
+            keywords.append(rng.choice(["Machine Learning", "data analysis", "go", "REACT", "video"]))
+        else:
+            # Last word of a title plus the first word of its description: only a match
+            # if it occurs inside one field, never across the two
+            row = rng.choice(rows)
+            keywords.append(f"{row['title'].split()[-1]} {row['description'].split()[0]}")
+    return {
+        "categories": rng.sample(synthetic.CATEGORIES, rng.randint(1, 4)),
+        "keywords": keywords,
+        "client_locations": rng.sample(synthetic.COUNTRIES, rng.randint(1, 4)) if rng.random() < 0.3 else [],
+        "exclude_locations": rng.sample(synthetic.COUNTRIES, rng.randint(1, 2)) if rng.random() < 0.3 else [],
+        "min_client_rating": rng.choice([None, None, 3.5, 4.5]),
+        "job_types": rng.sample(["FIXED", "HOURLY"], 1) if rng.random() < 0.3 else [],
+        "skills": skill_keys(rng.sample(synthetic.SKILLS, rng.randint(1, 3))) if rng.random() < 0.4 else [],
+        "skills_match": rng.choice(["any", "all"]),
+    }
+
+
+def window(rows):
+    recent = RecentJobs(timedelta(hours=24))
+    recent.add([JobRecord(row, seq) for seq, row in enumerate(rows, 1)], len(rows))
+    return recent
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_search_matches_sql_predicates(seed):
+    rng = random.Random(seed)
+    rows = randomized_rows(seed)
+    recent = window(rows)
+    since = datetime.utcnow() - timedelta(days=1)
+    for _ in range(200):
+        query = random_query(rng, rows)
+        found = [record.id for record in recent.search(since, **query)]
+        assert found == sql_reference(rows, since, **query), query
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_paging_matches_sql_order(seed, monkeypatch):
+    rng = random.Random(seed)
+    rows = randomized_rows(seed)
+    monkeypatch.setattr(jobs_router, "recent_jobs", window(rows))
+    since = datetime.utcnow() - timedelta(days=1)
+    for _ in range(30):
+        query = random_query(rng, rows)
+        query["keywords"] = []  # broader queries, so results span several pages
+        expected = sql_reference(rows, since, **query)
+        seen, after, total = [], None, None
+        while True:
+            page = jobs_router.search_recent_jobs(
+                since, query["categories"], query["keywords"], query["client_locations"], query["exclude_locations"],
+                query["min_client_rating"], query["job_types"], query["skills"], query["skills_match"],
+                7, after, ["id"], after is None,
+            )
+            if after is None:
+                total = page["total_matches"]
+            seen += [match["id"] for match in page["matches"]]
+            if not page["next_cursor"]:
+                break
+            after = jobs_router.decode_cursor(page["next_cursor"], ranked=False)
+        assert seen == expected
+        assert total == len(expected)
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+from uuid import UUID
+
+from background_tasks import scheduler
+from services.telegram_delivery import DeliveryResult
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+class FakeStore:
+    """The pipeline's Postgres side: ingested jobs, the alert cursor and job_alerts claims."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.cursor = 0
+        self.claimed = set()
+
+    async def read_jobs_after_seq(self, after_seq):
+        jobs = [job for job in self.jobs if job["ingest_seq"] > after_seq]
+        return jobs, max((job["ingest_seq"] for job in jobs), default=None)
+
+    async def get_pipeline_cursor(self, name, minutes=10):
+        return self.cursor
+
+    async def set_pipeline_cursor(self, name, position):
+        self.cursor = position
+
+    async def record_job_alerts(self, pairs):
+        fresh = set(pairs) - self.claimed
+        self.claimed |= fresh
+        return fresh
+
+    async def release_job_alerts(self, pairs):
+        self.claimed -= set(pairs)
+
+
+def job(seq):
+    return {
+        "id": f"job-{seq}", "title": f"Job {seq}", "url": f"https://www.upwork.com/jobs/~0{seq}",
+        "type": "FIXED", "category": "Writing", "description": "", "skills": [], "budget": 100.0,
+        "location": "Germany", "client_spend": 0, "client_rating": 5.0, "published_at": datetime.utcnow(),
+        "ingest_seq": seq,
+    }
+
+
+def test_retryable_inline_failure_is_delivered_next_cycle(monkeypatch):
+    store = FakeStore([job(1), job(2), job(3)])
+    delivered, attempts = [], {}
+
+    async def send_telegram_alert(chat_id, jobs):
+        results = []
+        for j in jobs:
+            attempts[j["id"]] = attempts.get(j["id"], 0) + 1
+            # job-2 hits a transient error the first time only
+            ok = j["id"] != "job-2" or attempts[j["id"]] > 1
+            if ok:
+                delivered.append(j["id"])
+            results.append(DeliveryResult(chat_id=chat_id, ref=j["id"], ok=ok, retryable=not ok))
+        return results
+
+    users = [{"user_id": USER_ID, "telegram_id": "1", "delivery_mode": "instant",
+              "filters": [{"id": 1, "keywords": [], "categories": []}]}]
+    crawls = iter([["job-1", "job-2", "job-3"], []])
+
+    async def run_crawler():
+        return next(crawls)
+
+    async def noop():
+        return None
+
+    monkeypatch.setattr(scheduler, "ALERT_DELIVERY", "inline")
+    monkeypatch.setattr(scheduler, "coordination_enabled", lambda: False)
+    monkeypatch.setattr(scheduler, "run_crawler", run_crawler)
+    monkeypatch.setattr(scheduler, "refresh_recent_jobs", noop)
+    monkeypatch.setattr(scheduler, "read_jobs_after_seq", store.read_jobs_after_seq)
+    monkeypatch.setattr(scheduler, "get_pipeline_cursor", store.get_pipeline_cursor)
+    monkeypatch.setattr(scheduler, "set_pipeline_cursor", store.set_pipeline_cursor)
+    monkeypatch.setattr(scheduler, "record_job_alerts", store.record_job_alerts)
+    monkeypatch.setattr(scheduler, "release_job_alerts", store.release_job_alerts)
+    monkeypatch.setattr(scheduler, "get_users_with_filters_and_telegram", lambda: users)
+    monkeypatch.setattr(scheduler, "get_subscribers_version", lambda: 1)
+    monkeypatch.setattr(scheduler, "send_telegram_alert", send_telegram_alert)
+    monkeypatch.setattr(scheduler, "_filter_index", (None, None))
+    monkeypatch.setattr(scheduler, "_cursor_current", False)
+
+    asyncio.run(scheduler.run_pipeline())
+    assert sorted(delivered) == ["job-1", "job-3"]
+    assert store.cursor == 1  # held below the released job
+    assert (UUID(USER_ID), "job-2") not in store.claimed
+
+    # Nothing new is crawled, but the released alert is still retried
+    asyncio.run(scheduler.run_pipeline())
+    assert sorted(delivered) == ["job-1", "job-2", "job-3"]
+    assert attempts == {"job-1": 1, "job-2": 2, "job-3": 1}
+    assert store.cursor == 3
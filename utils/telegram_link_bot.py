@@ -1,56 +1,63 @@
 import os
-import requests
+import httpx
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 from dotenv import load_dotenv
 import logging
+from services.telegram_messages import WELCOME_MESSAGE, LINKED_MESSAGE, USER_NOT_FOUND_MESSAGE, LINK_FAILED_MESSAGE
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")  # Your Telegram bot token
 BACKEND_LINK_ENDPOINT = os.getenv("BACKEND_LINK_ENDPOINT")  # e.g., http://localhost:8000/api/link-telegram
+TELEGRAM_BOT_MODE = os.getenv("TELEGRAM_BOT_MODE", "polling")  # "webhook": the API serves the bot instead
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One pooled client for every backend call, so a slow link never blocks the bot's event loop
+backend = httpx.AsyncClient(timeout=httpx.Timeout(10, connect=5))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     logger.info(f"Received /start command from chat_id={chat_id}, args={context.args}")
     if context.args:
         user_token = context.args[0]
         try:
-            resp = requests.post(
+            resp = await backend.post(
                 BACKEND_LINK_ENDPOINT,
                 json={"user_token": user_token, "chat_id": chat_id}
             )
             logger.info(f"POST to BACKEND_LINK_ENDPOINT with user_token={user_token}, chat_id={chat_id}, status_code={resp.status_code}")
             if resp.status_code == 200:
-                await update.message.reply_text("✅ Your Telegram is now linked! Please create job filters on <a href='https://freelancelot.app/dashboard'>dashboard</a> to start recieving job alerts.", parse_mode="HTML", disable_web_page_preview=True)
+                await update.message.reply_text(LINKED_MESSAGE, parse_mode="HTML", disable_web_page_preview=True)
                 logger.info(f"Sent success message to chat_id={chat_id}")
             elif resp.status_code == 404:
-                await update.message.reply_text("⚠️ User not found. Please signup first on <a href='https://freelancelot.app'>Freelancelot</a>.", parse_mode="HTML")
+                await update.message.reply_text(USER_NOT_FOUND_MESSAGE, parse_mode="HTML")
                 logger.info(f"Sent user not found message to chat_id={chat_id}")
             else:
-                await update.message.reply_text("⚠️ Failed to link Telegram. Please try again or contact support.")
+                await update.message.reply_text(LINK_FAILED_MESSAGE)
                 logger.info(f"Sent generic failure message to chat_id={chat_id}")
-        except Exception as e:
-            await update.message.reply_text(f"⚠️ Error: {e}")
-            logger.error(f"Exception during linking for chat_id={chat_id}: {e}")
+        except Exception:
+            logger.exception(f"Exception during linking for chat_id={chat_id}, user_token={user_token}")
+            await update.message.reply_text(LINK_FAILED_MESSAGE)
     else:
-        welcome_message = (
-            "👋 Welcome to Freelancelot Alert Bot!\n\n"
-            "Get instant Upwork job alerts from Freelancelot.app right here on Telegram.\n\n"
-            "To link your account, please copy the /start command from your dashboard: https://freelancelot.app/profile\n\n"
-            "If you need help, visit our website or contact support."
-        )
-        await update.message.reply_text(welcome_message)
+        await update.message.reply_text(WELCOME_MESSAGE)
         logger.info(f"Sent welcome message to chat_id={chat_id}")
 
+async def close_backend(app):
+    await backend.aclose()
+
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    if TELEGRAM_BOT_MODE == "webhook":
+        # Telegram refuses polling while a webhook is set; the API's /api/telegram/webhook route serves the bot
+        logger.info("TELEGRAM_BOT_MODE=webhook, updates are handled by the API; not polling")
+        return
+    # Updates are handled concurrently, so a burst of /start commands is not processed one by one
+    app = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(True).post_shutdown(close_backend).build()
     app.add_handler(CommandHandler('start', start))
     app.run_polling()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()